@@ -1,32 +1,56 @@
 import os
+from types import MappingProxyType
 
 # --- Database Configuration ---
 # Build an absolute path to the database file in the project root
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 DATABASE_PATH = f"sqlite:///{os.path.join(project_root, 'market_data.db')}"
 
+def _env_tuple(name, default):
+    """Reads a comma-separated override from the environment, falling back to default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
 # --- Trading Configuration ---
 # List of exchanges to use for data fetching, scanning, and backtesting.
 # Ensure that ccxt supports these exchanges.
-EXCHANGES = ['bybit', 'bitstamp']
+# Override with e.g. CRYPTO_ARB_EXCHANGES=bybit,bitstamp
+EXCHANGES = _env_tuple('CRYPTO_ARB_EXCHANGES', ('bybit', 'bitstamp'))
 
 # Exchange-specific trading pairs configuration
 # Bybit uses perpetual futures contracts, Bitstamp uses spot pairs
-EXCHANGE_TRADING_PAIRS = {
-    'bybit': [
+# Read-only so the configuration can be shared safely between modules and tasks
+EXCHANGE_TRADING_PAIRS = MappingProxyType({
+    'bybit': (
         'BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT', 'XRP/USDT:USDT',
         'ADA/USDT:USDT', 'DOT/USDT:USDT', 'UNI/USDT:USDT', 'AAVE/USDT:USDT',
         'LINK/USDT:USDT', 'XLM/USDT:USDT', 'SHIB/USDT'
-    ],  # Perpetual futures (except SHIB which is spot)
-    'bitstamp': [
+    ),  # Perpetual futures (except SHIB which is spot)
+    'bitstamp': (
         'BTC/USD', 'ETH/USD', 'SOL/USD', 'XRP/USD',
         'ADA/USD', 'DOT/USD', 'UNI/USD', 'AAVE/USD',
         'LINK/USD', 'XLM/USD', 'SHIB/USD'
-    ]  # Spot pairs
-}
+    )  # Spot pairs
+})
+
+# Trading pair per exchange and base currency, e.g. PAIR_BY_BASE['bybit']['BTC'] -> 'BTC/USDT:USDT'
+PAIR_BY_BASE = MappingProxyType({
+    exchange: MappingProxyType({pair.split('/', 1)[0]: pair for pair in pairs})
+    for exchange, pairs in EXCHANGE_TRADING_PAIRS.items()
+})
+
+def get_default_type(exchange_name, symbol):
+    """Returns the ccxt market type to use for a symbol, or None for the exchange default."""
+    if exchange_name == 'bybit':
+        # SHIB is only traded as spot on Bybit, all other pairs are perpetual futures
+        return 'spot' if symbol == 'SHIB/USDT' else 'future'
+    return None
 
 # Legacy support - all unique trading pairs for backward compatibility
-TRADING_PAIRS = [
+# Override with e.g. CRYPTO_ARB_TRADING_PAIRS=BTC/USD,ETH/USD
+TRADING_PAIRS = _env_tuple('CRYPTO_ARB_TRADING_PAIRS', (
     # Futures pairs
     'BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT', 'XRP/USDT:USDT',
     'ADA/USDT:USDT', 'DOT/USDT:USDT', 'UNI/USDT:USDT', 'AAVE/USDT:USDT',
@@ -35,15 +59,23 @@ TRADING_PAIRS = [
     'BTC/USD', 'ETH/USD', 'SOL/USD', 'XRP/USD',
     'ADA/USD', 'DOT/USD', 'UNI/USD', 'AAVE/USD',
     'LINK/USD', 'XLM/USD', 'SHIB/USD', 'SHIB/USDT'
-]
+))
+
+# Flat list of every (exchange, symbol) series to fetch, falling back to
+# TRADING_PAIRS for exchanges without a specific configuration
+EXCHANGE_PAIRS = tuple(
+    (exchange, symbol)
+    for exchange in EXCHANGES
+    for symbol in EXCHANGE_TRADING_PAIRS.get(exchange, TRADING_PAIRS)
+)
 
 # --- Fee Configuration ---
 # Estimated taker fees for each exchange. These are used by the scanner
 # to calculate net profit. Taker fees are used because an arbitrage trade
 # needs to execute immediately.
 # Futures and spot fees can differ - these are estimates and can vary.
-EXCHANGE_FEES = {
+EXCHANGE_FEES = MappingProxyType({
     'binance': 0.0004,   # 0.04% (futures taker fee)
     'bybit': 0.0006,     # 0.06% (futures taker fee)
     'bitstamp': 0.0004,   # 0.04%% (spot taker fee)
-}
+})
@@ -1,17 +1,58 @@
 """
 Environment configuration module for loading API keys and sensitive data.
 """
+import functools
 import os
 from pathlib import Path
 
+# Guard so that repeated calls (e.g. from several entry points) only read the file once
+_loaded = False
+
+
+def parse_env_text(text):
+    """
+    Parse the contents of a .env file.
+    
+    Args:
+        text (str): Raw file contents
+    
+    Returns:
+        dict: Mapping of variable names to values, with surrounding quotes removed
+    """
+    values = {}
+    for line in text.splitlines():
+        line = line.strip()
+        # Skip empty lines and comments
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+
+        # Parse KEY=VALUE pairs
+        key, value = line.split('=', 1)
+        key = key.strip()
+        value = value.strip()
+
+        # Remove quotes if present
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        values[key] = value
+    return values
+
 
 def load_env_file(env_file='.env'):
     """
     Load environment variables from a .env file.
     
+    Entry points call this once at startup, before importing modules that read
+    configuration from the environment.
+    
     Args:
         env_file (str): Path to the .env file relative to project root
     """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+
     # Get the project root directory
     project_root = Path(__file__).parent.parent
     env_path = project_root / env_file
@@ -22,36 +63,25 @@ def load_env_file(env_file='.env'):
         return
     
     try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Parse KEY=VALUE pairs
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    # Remove quotes if present
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
-                    
-                    # Only set if not already in environment
-                    if key not in os.environ:
-                        os.environ[key] = value
+        values = parse_env_text(env_path.read_text(encoding='utf-8'))
+
+        # Only set if not already in environment
+        for key, value in values.items():
+            os.environ.setdefault(key, value)
+        # Credentials looked up before the file was loaded may be stale
+        get_api_credentials.cache_clear()
     
     except Exception as e:
         print(f"Error loading {env_file} file: {e}")
 
 
+@functools.lru_cache(maxsize=None)
 def get_api_credentials(exchange_name):
     """
     Get API credentials for a given exchange.
+
+    Results are cached per exchange since environment variables do not change
+    while the process is running. Callers must not mutate the returned dict.
     
     Args:
         exchange_name (str): Name of the exchange (e.g., 'bybit', 'binance')
@@ -81,9 +111,5 @@ def has_api_credentials(exchange_name):
     Returns:
         bool: True if both API key and secret are available
     """
-    credentials = get_api_credentials(exchange_name)
-    return bool(credentials.get('api_key') and credentials.get('api_secret'))
-
+    return bool(get_api_credentials(exchange_name))
 
-# Load .env file when module is imported
-load_env_file()
@@ -1,9 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.config import DATABASE_PATH
 
-engine = create_engine(DATABASE_PATH)
+engine = create_engine(DATABASE_PATH, connect_args={"check_same_thread": False}, future=True)
 Session = sessionmaker(bind=engine)
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tunes every new SQLite connection for write-heavy market data ingestion."""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the writer and batches fsyncs
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is safe in WAL mode and avoids an fsync on every commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped reads
+    cursor.close()
+
 def get_session():
-    return Session()
\ No newline at end of file
+    return Session()
@@ -7,99 +7,308 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-import ccxt
+if __name__ == '__main__':
+    # Load .env before app.config reads the environment, as main.py and scheduler.py do
+    from app.config_env import load_env_file
+    load_env_file()
+
+import asyncio
+import ccxt.async_support as ccxt  # Use the async version of ccxt
+import ccxt.pro as ccxtpro  # Websocket streaming versions of the async exchanges
 import datetime
+import itertools
 import logging
+import numpy as np
+import time
+from sqlalchemy import func
 from app.database.database import get_session
 from app.models.market_data import MarketData, Base
-from app.config import EXCHANGES, TRADING_PAIRS, EXCHANGE_TRADING_PAIRS
+from app.config import EXCHANGE_PAIRS, get_default_type
 from app.database.database import engine
-from app.config_env import get_api_credentials, has_api_credentials
+from app.config_env import get_api_credentials
+from app.utils.markets_cache import load_markets_cached, wait_for_markets_refresh
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Upper bound on candles requested per symbol, matching the most common exchange page size
+MAX_OHLCV_LIMIT = 1000
+# Extra candles requested beyond the elapsed minutes to cover clock skew and partial candles
+OHLCV_LIMIT_MARGIN = 5
+
+# Raw insert statement for the ingestion hot path. Rows that already exist
+# (same exchange, symbol and timestamp) are skipped by the unique constraint.
+INSERT_MARKET_DATA_SQL = (
+    "INSERT OR IGNORE INTO market_data (exchange, symbol, timestamp, open, high, low, close, volume) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# Streaming mode: seconds between bulk writes of the queued candles
+STREAM_FLUSH_INTERVAL = 10
+# Streaming mode: seconds between REST polls for exchanges without OHLCV websockets
+STREAM_POLL_INTERVAL = 60
+# Streaming mode: seconds to wait before resubscribing after a network error
+STREAM_RECONNECT_DELAY = 5
+CANDLE_DURATION_MS = 60 * 1000
+
 def setup_database():
     """Ensures database and tables are created."""
     logging.info("Setting up database tables if they don't exist...")
     Base.metadata.create_all(engine)
+    # Databases set up by an earlier version carry an index identical to the unique constraint's,
+    # which only doubles the work of every insert
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_md_ex_sym_ts")
     logging.info("Database setup complete.")
 
-def fetch_market_data():
-    """Fetches OHLCV data from exchanges and stores it in the database."""
+def create_exchange(exchange_name, default_type=None, module=None):
+    """
+    Creates an async ccxt exchange instance with API credentials if available.
+    Pass module=ccxtpro to get an instance that also supports websocket streams.
+    """
+    exchange_config = {
+        'sandbox': False,  # Use production endpoints
+        'enableRateLimit': True,  # Enable rate limiting
+    }
+    if default_type:
+        exchange_config['options'] = {'defaultType': default_type}
+    if module is ccxtpro:
+        # Make watch_ohlcv return every cached candle, not only those updated since the last call,
+        # so a candle whose final update arrived before it was seen as closed is still delivered
+        exchange_config['newUpdates'] = False
+
+    # Add API credentials if available
+    credentials = get_api_credentials(exchange_name)
+    if credentials:
+        exchange_config['apiKey'] = credentials['api_key']
+        exchange_config['secret'] = credentials['api_secret']
+
+    return getattr(module or ccxt, exchange_name)(exchange_config)
+
+def local_utc_offset_ms(timestamps_ms):
+    """
+    Returns the local UTC offset in milliseconds of epoch millisecond timestamps, the offset
+    datetime.fromtimestamp applies. A scalar when the whole batch shares one offset, which is
+    the case unless it spans a daylight saving change.
+    """
+    first, last = (time.localtime(int(t) // 1000).tm_gmtoff for t in (timestamps_ms.min(), timestamps_ms.max()))
+    if first == last:
+        return first * 1000
+    return np.array([time.localtime(t // 1000).tm_gmtoff * 1000 for t in timestamps_ms.tolist()], dtype=np.int64)
+
+def ohlcv_to_rows(exchange_name, symbol, ohlcv):
+    """Converts a list of ccxt OHLCV candles to market_data row tuples."""
+    # Convert the whole batch at once instead of building a datetime per candle in Python.
+    # Timestamps are naive local time like datetime.fromtimestamp gives, formatted the way
+    # SQLAlchemy stores DateTime columns in SQLite.
+    candles = np.asarray(ohlcv, dtype=np.float64)
+    timestamps_ms = candles[:, 0].astype(np.int64)
+    timestamps_ms += local_utc_offset_ms(timestamps_ms)
+    timestamps = np.datetime_as_string(timestamps_ms.astype('datetime64[ms]'), unit='us')
+    timestamps = np.char.replace(timestamps, 'T', ' ').tolist()
+    # zip assembles the row tuples in C from whole columns, no per-row Python code
+    return list(zip(
+        itertools.repeat(exchange_name), itertools.repeat(symbol), timestamps, *candles[:, 1:6].T.tolist()
+    ))
+
+def insert_market_data(rows):
+    """Bulk inserts market_data row tuples, skipping candles that are already stored."""
+    # Write straight through the DBAPI with executemany in one transaction,
+    # skipping ORM instance construction and statement compilation
+    with engine.begin() as conn:
+        conn.exec_driver_sql(INSERT_MARKET_DATA_SQL, rows)
+
+async def fetch_symbol_ohlcv(exchange, exchange_name, symbol, since, limit):
+    """Fetches 1m OHLCV candles for a single symbol and returns them as row tuples."""
+    try:
+        ohlcv = await exchange.fetch_ohlcv(symbol, '1m', since=since, limit=limit)
+    except ccxt.BaseError as e:
+        logging.error(f"Error fetching {symbol} from {exchange_name}: {e}")
+        return []
+
+    if not ohlcv:
+        logging.warning(f"No OHLCV data returned for {symbol} from {exchange_name}.")
+        return []
+
+    return ohlcv_to_rows(exchange_name, symbol, ohlcv)
+
+async def fetch_exchange_ohlcv(exchange_name, since_by_symbol):
+    """
+    Concurrently fetches OHLCV candles for all symbols of one exchange.
+    since_by_symbol maps each symbol to its (since, limit) fetch window.
+    Returns one list of row tuples per symbol.
+    One exchange instance is shared per market type so markets are only loaded once.
+    """
+    if get_api_credentials(exchange_name):
+        logging.info(f"Using API credentials for {exchange_name}")
+    else:
+        logging.info(f"No API credentials found for {exchange_name}, using public endpoints only")
+
+    symbols_by_type = {}
+    for symbol in since_by_symbol:
+        symbols_by_type.setdefault(get_default_type(exchange_name, symbol), []).append(symbol)
+
+    exchanges = []
+    try:
+        tasks = []
+        for default_type, symbols in symbols_by_type.items():
+            exchange = create_exchange(exchange_name, default_type)
+            exchanges.append(exchange)
+            if not exchange.has['fetchOHLCV']:
+                logging.warning(f"Exchange '{exchange_name}' does not support fetchOHLCV. Skipping.")
+                return []
+            await load_markets_cached(exchange)
+            tasks.extend(fetch_symbol_ohlcv(exchange, exchange_name, symbol, *since_by_symbol[symbol]) for symbol in symbols)
+    except (ccxt.BaseError, AttributeError) as e:
+        logging.error(f"Failed to initialize exchange '{exchange_name}': {e}")
+        return []
+    else:
+        return await asyncio.gather(*tasks)
+    finally:
+        # Always close the connections to release resources
+        await asyncio.gather(*(exchange.close() for exchange in exchanges))
+
+async def fetch_market_data():
+    """Fetches OHLCV data from all exchanges concurrently and stores it in the database."""
     with get_session() as session:
-        new_market_data_points = []
-        for exchange_name in EXCHANGES:
-            try:
-                # Initialize exchange configuration
-                exchange_config = {
-                    'sandbox': False,  # Use production endpoints
-                    'enableRateLimit': True,  # Enable rate limiting
-                }
-                
-                # Set market type for futures exchanges  
-                # Note: We'll handle SHIB as spot during the symbol loop
-                
-                # Add API credentials if available
-                credentials = get_api_credentials(exchange_name)
-                if credentials:
-                    exchange_config['apiKey'] = credentials['api_key']
-                    exchange_config['secret'] = credentials['api_secret']
-                    logging.info(f"Using API credentials for {exchange_name}")
-                else:
-                    logging.info(f"No API credentials found for {exchange_name}, using public endpoints only")
-
-                exchange = getattr(ccxt, exchange_name)(exchange_config)
-                if not exchange.has['fetchOHLCV']:
-                    logging.warning(f"Exchange '{exchange_name}' does not support fetchOHLCV. Skipping.")
-                    continue
-            except (ccxt.BaseError, AttributeError) as e:
-                logging.error(f"Failed to initialize exchange '{exchange_name}': {e}")
-                continue
-
-            # Use exchange-specific trading pairs if available, fallback to global list
-            symbols_to_fetch = EXCHANGE_TRADING_PAIRS.get(exchange_name, TRADING_PAIRS)
-            for symbol in symbols_to_fetch:
-                try:
-                    # Set market type for Bybit based on symbol
-                    if exchange_name == 'bybit':
-                        if symbol == 'SHIB/USDT':
-                            exchange.options['defaultType'] = 'spot'  # SHIB is spot
-                        else:
-                            exchange.options['defaultType'] = 'future'  # Others are futures
-                    # Find the timestamp of the last entry to fetch only new data
-                    latest_record = session.query(MarketData.timestamp).filter_by(
-                        exchange=exchange_name, symbol=symbol
-                    ).order_by(MarketData.timestamp.desc()).first()
-
-                    since = None
-                    if latest_record:
-                        # ccxt uses millisecond timestamps, add 1ms to avoid fetching the same candle
-                        since = int(latest_record.timestamp.timestamp() * 1000) + 1
-                        logging.info(f"Fetching 1m OHLCV for {symbol} from {exchange_name} since {latest_record.timestamp}...")
-                    else:
-                        logging.info(f"No existing data. Fetching 1m OHLCV for {symbol} from {exchange_name}...")
-
-                    ohlcv = exchange.fetch_ohlcv(symbol, '1m', since=since)
-
-                    if not ohlcv:
-                        logging.warning(f"No OHLCV data returned for {symbol} from {exchange_name}.")
-                        continue
-
-                    for c in ohlcv:
-                        new_market_data_points.append(MarketData(
-                            exchange=exchange_name, symbol=symbol, timestamp=datetime.datetime.fromtimestamp(c[0] / 1000),
-                            open=c[1], high=c[2], low=c[3], close=c[4], volume=c[5]
-                        ))
-                except ccxt.BaseError as e:
-                    logging.error(f"Error fetching {symbol} from {exchange_name}: {e}")
-        if new_market_data_points:
-            session.add_all(new_market_data_points)
-            session.commit()
-            logging.info(f"Successfully committed {len(new_market_data_points)} new data points to the database.")
+        # Find the timestamp of the last entry of every series in a single query to fetch only new data
+        latest_timestamps = {
+            (exchange, symbol): timestamp
+            for exchange, symbol, timestamp in session.query(
+                MarketData.exchange, MarketData.symbol, func.max(MarketData.timestamp)
+            ).group_by(MarketData.exchange, MarketData.symbol).all()
+        }
+
+    now_ms = int(datetime.datetime.now().timestamp() * 1000)
+    since_by_exchange = {}
+    for exchange_name, symbol in EXCHANGE_PAIRS:
+        latest_timestamp = latest_timestamps.get((exchange_name, symbol))
+
+        since = limit = None
+        if latest_timestamp:
+            # Stored timestamps are naive local time, which timestamp() reads back as local
+            latest_ms = int(latest_timestamp.timestamp() * 1000)
+            # ccxt uses millisecond timestamps, add 1ms to avoid fetching the same candle
+            since = latest_ms + 1
+            # Only ask for the candles that can exist since the last one we stored
+            minutes_elapsed = (now_ms - latest_ms) // 60000
+            limit = max(1, min(minutes_elapsed + OHLCV_LIMIT_MARGIN, MAX_OHLCV_LIMIT))
+            logging.info(f"Fetching 1m OHLCV for {symbol} from {exchange_name} since {latest_timestamp}...")
         else:
-            logging.info("No new market data to commit.")
+            logging.info(f"No existing data. Fetching 1m OHLCV for {symbol} from {exchange_name}...")
+        since_by_exchange.setdefault(exchange_name, {})[symbol] = (since, limit)
+
+    results = await asyncio.gather(*(
+        fetch_exchange_ohlcv(exchange_name, since_by_symbol)
+        for exchange_name, since_by_symbol in since_by_exchange.items()
+    ))
+    # Flatten the per-exchange, per-symbol row lists once
+    new_market_data_points = list(itertools.chain.from_iterable(itertools.chain.from_iterable(results)))
+
+    if new_market_data_points:
+        insert_market_data(new_market_data_points)
+        logging.info(f"Successfully committed {len(new_market_data_points)} new data points to the database.")
+    else:
+        logging.info("No new market data to commit.")
+
+    # Let stale markets caches finish refreshing before the event loop goes away
+    await wait_for_markets_refresh()
+
+async def stream_symbol_ohlcv(exchange, exchange_name, symbol, queue):
+    """
+    Pushes closed 1m candles for one symbol onto the queue until cancelled.
+    Uses watch_ohlcv where the exchange supports it and polls fetch_ohlcv otherwise.
+    """
+    use_websocket = exchange.has.get('watchOHLCV')
+    if not use_websocket:
+        logging.info(f"{exchange_name} has no OHLCV websocket, polling {symbol} every {STREAM_POLL_INTERVAL}s")
+
+    last_timestamp = None
+    while True:
+        try:
+            if use_websocket:
+                ohlcv = await exchange.watch_ohlcv(symbol, '1m')
+            else:
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+                since = last_timestamp + 1 if last_timestamp is not None else None
+                ohlcv = await exchange.fetch_ohlcv(symbol, '1m', since=since)
+        except ccxt.NetworkError as e:
+            logging.warning(f"Stream for {symbol} on {exchange_name} interrupted: {e}. Retrying...")
+            await asyncio.sleep(STREAM_RECONNECT_DELAY)
+            continue
+        except ccxt.BaseError as e:
+            logging.error(f"Stopping stream for {symbol} on {exchange_name}: {e}")
+            return
+
+        if not ohlcv:
+            continue
+        # The last candle is still forming and would be stored half-built by INSERT OR IGNORE,
+        # and websocket updates resend the cached candles, so only queue new closed ones.
+        # A candle is closed once a newer one exists or a full minute has passed since it opened.
+        cutoff = max(exchange.milliseconds() - CANDLE_DURATION_MS, ohlcv[-1][0] - 1)
+        closed = [
+            candle for candle in ohlcv
+            if candle[0] <= cutoff and (last_timestamp is None or candle[0] > last_timestamp)
+        ]
+        if closed:
+            last_timestamp = closed[-1][0]
+            queue.put_nowait(ohlcv_to_rows(exchange_name, symbol, closed))
+
+def flush_stream_queue(queue):
+    """Writes every row currently waiting in the queue in a single transaction."""
+    rows = []
+    while not queue.empty():
+        rows.extend(queue.get_nowait())
+    if rows:
+        insert_market_data(rows)
+        logging.info(f"Streamed {len(rows)} new data points to the database.")
+
+async def write_stream_queue(queue):
+    """Flushes queued candles to the database every STREAM_FLUSH_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(STREAM_FLUSH_INTERVAL)
+        flush_stream_queue(queue)
+
+async def stream_market_data():
+    """
+    Runs the feed as a long-lived service until cancelled.
+    Backfills missing candles over REST, then keeps one websocket subscription open per symbol
+    and writes the closed candles in batches.
+    """
+    await fetch_market_data()
+
+    queue = asyncio.Queue()
+    exchanges = {}
+    tasks = []
+    try:
+        for exchange_name, symbol in EXCHANGE_PAIRS:
+            key = (exchange_name, get_default_type(exchange_name, symbol))
+            if key not in exchanges:
+                # Exchanges missing from ccxt.pro fall back to the plain async client and REST polling
+                module = ccxtpro if hasattr(ccxtpro, exchange_name) else ccxt
+                try:
+                    exchanges[key] = create_exchange(*key, module=module)
+                except (ccxt.BaseError, AttributeError) as e:
+                    logging.error(f"Failed to initialize exchange '{exchange_name}': {e}")
+                    exchanges[key] = None
+                else:
+                    await load_markets_cached(exchanges[key])
+            if exchanges[key] is not None:
+                tasks.append(asyncio.create_task(stream_symbol_ohlcv(exchanges[key], exchange_name, symbol, queue)))
+
+        writer = asyncio.create_task(write_stream_queue(queue))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            writer.cancel()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Persist whatever arrived since the last flush before shutting down
+        flush_stream_queue(queue)
+        await asyncio.gather(*(exchange.close() for exchange in exchanges.values() if exchange is not None))
 
 if __name__ == '__main__':
     # setup_database() # Uncomment to run once during initial setup
-    fetch_market_data()
\ No newline at end of file
+    asyncio.run(fetch_market_data())
\ No newline at end of file
@@ -16,7 +16,10 @@ class MarketData(Base):
     close = Column(Float)
     volume = Column(Float)
 
-    __table_args__ = (UniqueConstraint('exchange', 'symbol', 'timestamp', name='_exchange_symbol_timestamp_uc'),)
+    __table_args__ = (
+        # Its unique index also serves the per-series latest timestamp lookups in the feed
+        UniqueConstraint('exchange', 'symbol', 'timestamp', name='_exchange_symbol_timestamp_uc'),
+    )
 
     def __repr__(self):
         return f'<MarketData(exchange={self.exchange}, symbol={self.symbol}, timestamp={self.timestamp})>'
\ No newline at end of file
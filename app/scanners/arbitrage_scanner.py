@@ -1,248 +1,757 @@
+import aiohttp
 import asyncio
+import certifi
 import ccxt.async_support as ccxt  # Use the async version of ccxt
+import ccxt.pro as ccxtpro  # Websocket streaming versions of the async exchanges
+import decimal
 import logging
-import json
-import os
+import logging.handlers
+import numpy as np
+import orjson
+import random
+import ssl
 import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from app.config import EXCHANGES, TRADING_PAIRS, EXCHANGE_FEES, EXCHANGE_TRADING_PAIRS
+from decimal import Decimal
+from types import MappingProxyType
+from app.config import (
+    EXCHANGES, EXCHANGE_FEES, EXCHANGE_TRADING_PAIRS, PAIR_BY_BASE, get_default_type,
+)
 from app.config_env import get_api_credentials
+from app.utils.markets_cache import load_markets_cached, wait_for_markets_refresh
 
 # Configure logging if not already configured by a higher-level script
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # File to save profitable opportunities
 OPPORTUNITIES_FILE = 'arbitrage_opportunities.jsonl'
-# File to save scanner output logs
+# File to save scanner output logs, rotated once it reaches the size limit
 SCANNER_LOG_FILE = 'scanner_output.log'
+SCANNER_LOG_MAX_BYTES = 50_000_000
+SCANNER_LOG_BACKUP_COUNT = 5
+# Log records buffered before they are written to the log file
+SCANNER_LOG_BUFFER_RECORDS = 200
 
-# Global variable to track if we're in continuous mode
-_log_file_handle = None
+# Dollar amount each opportunity is simulated with
+TRADE_AMOUNT_USD = 10000
+
+# Base currencies compared across exchanges, whatever the quote currency (USDT vs USD)
+BASE_CURRENCIES = ('BTC', 'ETH', 'SOL', 'XRP', 'ADA', 'DOT', 'UNI', 'AAVE', 'LINK', 'XLM', 'SHIB')
+
+# Scan plan, built once since the configuration does not change between scans:
+# one (base_index, exchange_index, exchange_name, pair) entry per pair that is actually traded.
+# The indexes are the row in BASE_CURRENCIES and the column in EXCHANGES of the scan_prices matrices.
+PLAN = tuple(
+    (i, j, exchange_name, PAIR_BY_BASE[exchange_name][base_currency])
+    for i, base_currency in enumerate(BASE_CURRENCIES)
+    for j, exchange_name in enumerate(EXCHANGES)
+    if exchange_name in EXCHANGE_TRADING_PAIRS and base_currency in PAIR_BY_BASE[exchange_name]
+)
+
+
+def _group_plan_symbols(plan):
+    """Collects the pairs of a scan plan per (exchange_name, default_type)."""
+    symbols_by_exchange = {}
+    for _, _, exchange_name, pair in plan:
+        symbols_by_exchange.setdefault((exchange_name, get_default_type(exchange_name, pair)), []).append(pair)
+    return MappingProxyType({key: tuple(pairs) for key, pairs in symbols_by_exchange.items()})
+
+
+# The PLAN pairs per (exchange_name, default_type), each group fetched through one exchange instance
+SYMBOLS_BY_EXCHANGE = _group_plan_symbols(PLAN)
+
+# Maximum number of in-flight requests per exchange, and across all exchanges
+MAX_CONCURRENT_REQUESTS_PER_EXCHANGE = 4
+MAX_CONCURRENT_REQUESTS = 32
+# Retries of a ticker request failing with a transient network error (timeouts, 429s, 5xx)
+TICKER_FETCH_RETRIES = 2
+# First retry delay in seconds, doubled on every further retry
+TICKER_RETRY_BASE_DELAY = 0.2
+
+# HTTP connection pool shared by all pooled exchange instances
+HTTP_CONNECTION_LIMIT = 200
+HTTP_CONNECTION_LIMIT_PER_HOST = 8
+HTTP_DNS_CACHE_TTL = 300
+HTTP_KEEPALIVE_TIMEOUT = 75
+
+# Live prices kept up to date by the ticker feeds in continuous mode:
+# exchange_name -> symbol -> {'bid': ..., 'ask': ..., 'timestamp': exchange timestamp, 'ts': monotonic receive time}
+LATEST = {}
+# Seconds between REST polls for exchanges without a ticker websocket
+TICKER_POLL_INTERVAL = 2
+# Seconds to wait before resubscribing after a websocket network error
+TICKER_RECONNECT_DELAY = 5
+# Prices older than this many seconds are left out of a scan
+TICKER_MAX_AGE = 30
+# Seconds a REST ticker request is shared with later callers for the same symbols
+TICKER_CACHE_TTL = 1.0
+
+# Taker fees as exact decimals; str() keeps the configured value instead of its binary approximation
+DECIMAL_FEES = {exchange_name: Decimal(str(fee)) for exchange_name, fee in EXCHANGE_FEES.items()}
+# Fixed precision for the profit simulation, independent of the thread's current decimal context
+DECIMAL_CONTEXT = decimal.Context(prec=28)
+
+# Continuous mode output, shown on stdout and kept in SCANNER_LOG_FILE.
+# It does not propagate so it stays out of the root handlers' diagnostic format.
+scan_logger = logging.getLogger(f"{__name__}.output")
+scan_logger.setLevel(logging.INFO)
+scan_logger.propagate = False
+
+# Report templates rendered by Opportunity.report, each written with a single call.
+# Fields are Opportunity attributes (o.*) plus the upper-cased buy_exchange/sell_exchange.
+OPPORTUNITY_REPORT = (
+    "\n" + "=" * 70 + "\n"
+    "  !!! ARBITRAGE OPPORTUNITY DETECTED for {o.base_currency} !!!\n"
+    + "=" * 70 + "\n"
+    "  TRADE SIMULATION (${o.trade_amount_usd:,.0f} investment):\n"
+    + "-" * 70 + "\n"
+    "  BUY:  {o.crypto_units_bought:.6f} {o.base_currency} on {buy_exchange:<10} ({o.buy_pair})\n"
+    "        Price: ${o.best_ask:,.2f} + {o.buy_fee_percent:.2f}% fee = ${o.effective_buy_price:,.2f}\n"
+    "        Cost:  ${o.total_buy_cost:,.2f} (including ${o.buy_fee_amount:,.2f} fee)\n"
+    "\n"
+    "  SELL: {o.crypto_units_bought:.6f} {o.base_currency} on {sell_exchange:<10} ({o.sell_pair})\n"
+    "        Price: ${o.best_bid:,.2f} - {o.sell_fee_percent:.2f}% fee = ${o.effective_sell_price:,.2f}\n"
+    "        Revenue: ${o.net_sell_revenue:,.2f} (after ${o.sell_fee_amount:,.2f} fee)\n"
+    + "-" * 70 + "\n"
+    "  PROFIT ANALYSIS:\n"
+    "  Gross Spread:     {o.gross_spread_percentage:+.4f}%\n"
+    "  Net Profit:       ${o.net_profit_usd:+.2f} ({o.net_profit_percentage:+.4f}%)\n"
+    "  Total Fees Paid:  ${o.total_fees_usd:.2f}\n"
+    "  Break-even at:    {o.required_spread:.3f}% spread\n"
+    + "=" * 70 + "\n"
+)
+NO_OPPORTUNITY_REPORT = (
+    "No profitable arbitrage opportunity found for {o.base_currency}.\n"
+    "  Current spread: {o.gross_spread_percentage:.4f}% | Required: {o.required_spread:.3f}% | Deficit: {o.spread_deficit:.3f}%\n"
+    "  Best Bid: ${o.best_bid:.2f} ({o.best_bid_exchange}) | Best Ask: ${o.best_ask:.2f} ({o.best_ask_exchange})\n"
+    "  Simulated loss: ${o.net_profit_usd:.2f} on ${o.trade_amount_usd} investment"
+)
+# Continuous mode, also given the running opportunity count as number
+CONTINUOUS_OPPORTUNITY_REPORT = (
+    "\n💰 OPPORTUNITY #{number}: {o.base_currency}\n"
+    "   Buy:  ${o.best_ask:,.2f} on {buy_exchange} ({o.buy_pair})\n"
+    "   Sell: ${o.best_bid:,.2f} on {sell_exchange} ({o.sell_pair})\n"
+    "   Profit: ${o.net_profit_usd:+.2f} ({o.net_profit_percentage:+.3f}%) on ${o.trade_amount_usd}\n"
+    "   Spread: {o.gross_spread_percentage:.3f}% | Fees: ${o.total_fees_usd:.2f}"
+)
+
+# Opportunities waiting for the writer task; only set while scan_continuously runs
+_opportunity_queue = None
+
+# Long-lived exchange instances keyed by (exchange_name, default_type), shared across
+# scans so connections, loaded markets and the rate limiter state are reused
+_EXCHANGE_POOL = {}
+# aiohttp session shared by the pooled instances, created lazily in the running event loop
+_shared_session = None
+
+# Request concurrency limits, created lazily for the running event loop
+_semaphores_loop = None
+_global_semaphore = None
+_EXCHANGE_SEMAPHORES = {}
+
+# Recent and in-flight REST ticker requests: (exchange_name, symbols) -> (monotonic start, future)
+_TICKER_CACHE = {}
 
 def save_opportunity_to_file(opportunity_data):
     """
     Save a profitable arbitrage opportunity to a JSON Lines file.
+    While the writer task runs the opportunity is queued for it instead of
+    opening and writing the file from the scan.
     """
+    if _opportunity_queue is not None:
+        _opportunity_queue.put_nowait(opportunity_data)
+        return
+
     try:
-        with open(OPPORTUNITIES_FILE, 'a') as f:
-            f.write(json.dumps(opportunity_data) + '\n')
+        with open(OPPORTUNITIES_FILE, 'ab') as f:
+            f.write(orjson.dumps(opportunity_data) + b'\n')
     except Exception as e:
         logging.error(f"Failed to save opportunity to file: {e}")
 
-def log_print(*args, **kwargs):
+async def opportunity_writer(queue):
     """
-    Custom print function that outputs to both console and log file.
+    Appends queued opportunities to OPPORTUNITIES_FILE through a single file handle,
+    flushing once per batch, until cancelled. Whatever is still queued is written on exit.
+    Records are flat dicts of primitives, encoded with orjson straight to bytes.
+    If writing fails, the task stops and opportunities are written directly again.
     """
-    global _log_file_handle
-    
-    # Print to console
-    print(*args, **kwargs)
-    
-    # Also write to log file if in continuous mode
-    if _log_file_handle:
+    global _opportunity_queue
+    try:
+        f = open(OPPORTUNITIES_FILE, 'ab')
+    except OSError as e:
+        logging.error(f"Failed to open {OPPORTUNITIES_FILE}, writing opportunities directly: {e}")
+        _opportunity_queue = None
+        return
+
+    with f:
         try:
-            # Convert args to string and write to file with timestamp
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            message = ' '.join(str(arg) for arg in args)
-            _log_file_handle.write(f"[{timestamp}] {message}\n")
-            _log_file_handle.flush()  # Ensure immediate write
-        except Exception as e:
-            print(f"Warning: Failed to write to log file: {e}")
+            while True:
+                f.write(orjson.dumps(await queue.get()) + b'\n')
+                # Write everything else that is already waiting before flushing
+                while not queue.empty():
+                    f.write(orjson.dumps(queue.get_nowait()) + b'\n')
+                f.flush()
+        except asyncio.CancelledError:
+            while not queue.empty():
+                f.write(orjson.dumps(queue.get_nowait()) + b'\n')
+            raise
+        except (OSError, orjson.JSONEncodeError) as e:
+            logging.error(f"Failed to save opportunity to file: {e}")
+            _opportunity_queue = None
+            # The handle may be unusable, the records still queued are written one by one
+            while not queue.empty():
+                save_opportunity_to_file(queue.get_nowait())
+
 
-def start_logging():
+def start_scan_log():
     """
-    Start logging output to file.
+    Attaches the stdout and log file handlers to scan_logger and logs the session start.
+    File records are buffered and written in batches instead of flushing every line.
+    Returns the handlers to pass to stop_scan_log.
     """
-    global _log_file_handle
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    handlers = [console_handler]
     try:
-        _log_file_handle = open(SCANNER_LOG_FILE, 'a', encoding='utf-8')
-        log_print(f"\n{'='*60}")
-        log_print(f"Scanner session started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        log_print(f"{'='*60}")
-    except Exception as e:
+        file_handler = logging.handlers.RotatingFileHandler(
+            SCANNER_LOG_FILE, maxBytes=SCANNER_LOG_MAX_BYTES, backupCount=SCANNER_LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+        handlers.append(logging.handlers.MemoryHandler(
+            SCANNER_LOG_BUFFER_RECORDS, flushLevel=logging.ERROR, target=file_handler
+        ))
+    except OSError as e:
         print(f"Warning: Could not open log file {SCANNER_LOG_FILE}: {e}")
-        _log_file_handle = None
 
-def stop_logging():
+    for handler in handlers:
+        scan_logger.addHandler(handler)
+    scan_logger.info(f"\n{'='*60}")
+    scan_logger.info(f"Scanner session started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    scan_logger.info(f"{'='*60}")
+    return handlers
+
+def flush_scan_log():
+    """Writes the buffered scan output to the log file."""
+    for handler in scan_logger.handlers:
+        handler.flush()
+
+def stop_scan_log(handlers):
+    """Logs the session end, then flushes and detaches the handlers from start_scan_log."""
+    scan_logger.info(f"\n{'='*60}")
+    scan_logger.info(f"Scanner session ended at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    scan_logger.info(f"{'='*60}\n")
+    for handler in handlers:
+        scan_logger.removeHandler(handler)
+        # Closing the memory handler flushes it but leaves the file handler it wraps open
+        target = getattr(handler, 'target', None)
+        handler.close()
+        if target is not None:
+            target.close()
+
+def clear_screen():
+    """
+    Clear the terminal screen for better real-time display.
+    Writes the ANSI clear and cursor-home sequences instead of spawning a clear/cls process.
+    """
+    sys.stdout.write('\x1b[2J\x1b[H')
+    sys.stdout.flush()
+
+
+def create_exchange(exchange_name, default_type=None, session=None):
+    """
+    Creates an async ccxt exchange instance with API credentials if available.
+    Exchanges covered by ccxt.pro get the streaming class, which also supports REST.
+    An instance given a session uses it instead of opening its own and leaves it open on close.
+    The caller is responsible for closing it; use get_exchange for a pooled instance.
+    """
+    exchange_config = {
+        'sandbox': False,
+        'enableRateLimit': True,
+        'newUpdates': False  # Recommended for fetch_ticker in async mode
+    }
+    if default_type:
+        exchange_config['options'] = {'defaultType': default_type}
+    if session is not None:
+        exchange_config['session'] = session
+
+    # Add API credentials if available
+    credentials = get_api_credentials(exchange_name)
+    if credentials:
+        exchange_config['apiKey'] = credentials['api_key']
+        exchange_config['secret'] = credentials['api_secret']
+
+    module = ccxtpro if hasattr(ccxtpro, exchange_name) else ccxt
+    return getattr(module, exchange_name)(exchange_config)
+
+
+def get_shared_session():
+    """
+    Returns the aiohttp session shared by all pooled exchange instances, creating it on first use.
+    One keep-alive connection pool with a DNS cache lets every exchange instance reuse open
+    TLS connections instead of each ccxt instance running its own default-configured pool.
+    """
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        connector = aiohttp.TCPConnector(
+            # Same certificate bundle ccxt uses for the sessions it creates itself
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            limit=HTTP_CONNECTION_LIMIT,
+            limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        _shared_session = aiohttp.ClientSession(connector=connector)
+    return _shared_session
+
+
+def get_exchange(exchange_name, default_type=None):
+    """
+    Returns the pooled exchange instance for an exchange and market type,
+    creating it on first use. Pooled instances are closed by close_all_exchanges.
+    """
+    key = (exchange_name, default_type)
+    exchange = _EXCHANGE_POOL.get(key)
+    if exchange is None:
+        exchange = _EXCHANGE_POOL[key] = create_exchange(exchange_name, default_type, get_shared_session())
+    return exchange
+
+
+def get_exchanges(keys):
     """
-    Stop logging output to file.
+    Returns the pooled exchange instance for each (exchange_name, default_type) key.
+    Exchanges that fail to initialize are logged and left out.
     """
-    global _log_file_handle
-    if _log_file_handle:
+    exchanges = {}
+    for key in keys:
         try:
-            log_print(f"\n{'='*60}")
-            log_print(f"Scanner session ended at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            log_print(f"{'='*60}\n")
-            _log_file_handle.close()
-            _log_file_handle = None
-        except Exception as e:
-            print(f"Warning: Error closing log file: {e}")
+            exchanges[key] = get_exchange(*key)
+        except (ccxt.BaseError, AttributeError) as e:
+            logging.error(f"  Could not initialize {key[0]}: {e}")
+    return exchanges
 
-def clear_screen():
+
+async def load_exchange_markets(exchanges):
+    """Loads the markets of exchange instances that have none yet, from the disk cache when possible."""
+    await asyncio.gather(*(load_markets_cached(exchange) for exchange in exchanges.values() if not exchange.markets))
+
+
+async def close_all_exchanges():
+    """Closes and forgets all pooled exchange instances and their shared session."""
+    global _shared_session
+    # Let stale markets caches finish refreshing before the event loop goes away
+    await wait_for_markets_refresh()
+    exchanges = list(_EXCHANGE_POOL.values())
+    _EXCHANGE_POOL.clear()
+    await asyncio.gather(*(exchange.close() for exchange in exchanges))
+    if _shared_session is not None:
+        session, _shared_session = _shared_session, None
+        await session.close()
+
+
+def get_request_semaphores(exchange_name):
     """
-    Clear the terminal screen for better real-time display.
+    Returns the (per-exchange, global) semaphores bounding requests in flight.
+    Semaphores are tied to an event loop, so they are created inside the running
+    loop and recreated when a new one is started (e.g. one asyncio.run per scan).
     """
-    os.system('clear' if os.name == 'posix' else 'cls')
+    global _semaphores_loop, _global_semaphore
+    loop = asyncio.get_running_loop()
+    if loop is not _semaphores_loop:
+        _semaphores_loop = loop
+        _global_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        _EXCHANGE_SEMAPHORES.clear()
+    semaphore = _EXCHANGE_SEMAPHORES.get(exchange_name)
+    if semaphore is None:
+        semaphore = _EXCHANGE_SEMAPHORES[exchange_name] = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS_PER_EXCHANGE)
+    return semaphore, _global_semaphore
 
 
-async def fetch_ticker_for_exchange(exchange_name, symbol):
+async def fetch_tickers_for_exchange(exchange, exchange_name, symbols):
     """
-    Asynchronously fetches ticker data for a given symbol from a single exchange.
-    Returns a tuple of (exchange_name, ticker_data) or logs an error and returns None.
+    Fetches bid/ask prices for several symbols from a single exchange instance.
+    Uses one fetch_tickers request where the exchange supports it, otherwise
+    falls back to concurrent fetch_ticker calls, bounded per exchange and globally.
+    Requests failing with a transient network error are retried with exponential backoff.
+    Returns a dict of symbol -> {'bid': ..., 'ask': ...} for the valid tickers.
     """
-    exchange = None
+    exchange_semaphore, global_semaphore = get_request_semaphores(exchange_name)
+
+    async def fetch_limited(method, *args):
+        for attempt in range(TICKER_FETCH_RETRIES + 1):
+            try:
+                async with exchange_semaphore, global_semaphore:
+                    return await method(*args)
+            # NetworkError covers RequestTimeout, ExchangeNotAvailable and RateLimitExceeded;
+            # any other error will not go away by asking again
+            except ccxt.NetworkError as e:
+                if attempt == TICKER_FETCH_RETRIES:
+                    raise
+                delay = TICKER_RETRY_BASE_DELAY * 2 ** attempt + random.random() * 0.1
+                logging.warning(f"  {exchange_name} request failed: {e}. Retrying in {delay:.2f}s...")
+                # Back off outside the semaphores so other requests can go ahead
+                await asyncio.sleep(delay)
+
     try:
-        # Initialize exchange configuration
-        exchange_config = {
-            'sandbox': False,
-            'enableRateLimit': True,
-            'newUpdates': False  # Recommended for fetch_ticker in async mode
-        }
-        
-        # Set market type based on exchange and symbol
-        if exchange_name == 'bybit':
-            # Use spot for SHIB, futures for all others
-            if symbol == 'SHIB/USDT':
-                exchange_config['options'] = {'defaultType': 'spot'}  # Use spot market for SHIB
-            else:
-                exchange_config['options'] = {'defaultType': 'future'}  # Use futures market for others
-        
-        # Add API credentials if available
-        credentials = get_api_credentials(exchange_name)
-        if credentials:
-            exchange_config['apiKey'] = credentials['api_key']
-            exchange_config['secret'] = credentials['api_secret']
-        
-        exchange = getattr(ccxt, exchange_name)(exchange_config)
-        if not exchange.has.get('fetchTicker'):
+        if exchange.has.get('fetchTickers'):
+            tickers = await fetch_limited(exchange.fetch_tickers, symbols)
+        elif exchange.has.get('fetchTicker'):
+            fetched = await asyncio.gather(
+                *(fetch_limited(exchange.fetch_ticker, symbol) for symbol in symbols), return_exceptions=True
+            )
+            tickers = {}
+            for symbol, ticker in zip(symbols, fetched):
+                if isinstance(ticker, Exception):
+                    logging.error(f"  Could not fetch ticker for {symbol} from {exchange_name}: {ticker}")
+                else:
+                    tickers[symbol] = ticker
+        else:
             logging.warning(f"  {exchange_name} does not support fetchTicker. Skipping.")
-            return None
+            return {}
+    except (ccxt.BaseError, AttributeError) as e:
+        logging.error(f"  Could not fetch tickers for {', '.join(symbols)} from {exchange_name}: {e}")
+        return {}
 
-        ticker = await exchange.fetch_ticker(symbol)
-        
-        if ticker.get('bid') and ticker.get('ask'):
-            # Successfully fetched a valid ticker
-            return exchange_name, {'bid': ticker['bid'], 'ask': ticker['ask']}
-        else:
+    prices = {}
+    for symbol in symbols:
+        ticker = tickers.get(symbol)
+        if ticker and ticker.get('bid') and ticker.get('ask'):
+            prices[symbol] = {'bid': ticker['bid'], 'ask': ticker['ask']}
+        elif ticker:
             logging.warning(f"  Ticker for {symbol} on {exchange_name} is missing bid/ask price.")
-            return None
+    return prices
 
-    except (ccxt.BaseError, AttributeError) as e:
-        logging.error(f"  Could not fetch ticker for {symbol} from {exchange_name}: {e}")
-        return None
-    finally:
-        if exchange:
-            await exchange.close()  # Always close the connection to release resources
+
+async def fetch_tickers_cached(exchange, exchange_name, symbols):
+    """
+    fetch_tickers_for_exchange memoized for TICKER_CACHE_TTL seconds.
+    Concurrent callers for the same symbols await the same in-flight request,
+    and callers shortly after it reuse its result. Callers must not mutate the result.
+    Failed requests (an exception, or no prices at all) are not reused.
+    """
+    key = (exchange_name, tuple(symbols))
+    now = time.monotonic()
+    cached = _TICKER_CACHE.get(key)
+    if cached:
+        started, future = cached
+        reusable = (
+            future.get_loop() is asyncio.get_running_loop()
+            and not future.cancelled()
+            and (not future.done() or (
+                now - started < TICKER_CACHE_TTL and future.exception() is None and future.result()
+            ))
+        )
+        if reusable:
+            return await asyncio.shield(future)
+
+    future = asyncio.ensure_future(fetch_tickers_for_exchange(exchange, exchange_name, symbols))
+    _TICKER_CACHE[key] = (now, future)
+    # Shielded so a cancelled caller does not cancel the request for the others
+    return await asyncio.shield(future)
 
 
-async def scan_for_arbitrage():
+@dataclass(slots=True)
+class Opportunity:
     """
-    Scans for arbitrage opportunities by fetching live ticker data concurrently.
-    Groups by base currency to compare across different quote currencies (USDT vs USD).
+    Simulated arbitrage trade for one base currency: buy on the exchange with the best
+    (lowest) ask and sell on the exchange with the best (highest) bid.
+    Amounts are floats for display; profitable is decided on exact decimal values.
     """
-    logging.info("Starting asynchronous arbitrage scan for live ticker data...")
+    base_currency: str
+    best_bid_exchange: str
+    best_bid: float
+    best_ask_exchange: str
+    best_ask: float
+    trade_amount_usd: float
+    buy_fee: float
+    sell_fee: float
+    effective_buy_price: float
+    effective_sell_price: float
+    crypto_units_bought: float
+    total_buy_cost: float
+    buy_fee_amount: float
+    net_sell_revenue: float
+    sell_fee_amount: float
+    net_profit_usd: float
+    net_profit_percentage: float
+    gross_spread_percentage: float
+    profitable: bool
 
-    # Group trading pairs by base currency
-    base_currencies = ['BTC', 'ETH', 'SOL', 'XRP', 'ADA', 'DOT', 'UNI', 'AAVE', 'LINK', 'XLM', 'SHIB']
-    
-    for base_currency in base_currencies:
-        logging.info(f"--- Scanning for {base_currency} ---")
-        
-        # Create tasks to fetch tickers for this base currency from all exchanges
-        tasks = []
-        for exchange_name in EXCHANGES:
-            if exchange_name in EXCHANGE_TRADING_PAIRS:
-                # Find the appropriate trading pair for this exchange
-                exchange_pairs = EXCHANGE_TRADING_PAIRS[exchange_name]
-                matching_pair = next((pair for pair in exchange_pairs if pair.startswith(f"{base_currency}/")), None)
-                if matching_pair:
-                    tasks.append(fetch_ticker_for_exchange(exchange_name, matching_pair))
-        
-        # Run all tasks and gather results
-        results = await asyncio.gather(*tasks)
-
-        # Filter out failed requests and build the tickers dictionary
-        tickers = {}
-        for result in results:
-            if result and len(result) == 2:
-                exchange, data = result
-                tickers[exchange] = data
-                # Get the trading pair for logging
-                exchange_pairs = EXCHANGE_TRADING_PAIRS.get(exchange, [])
-                matching_pair = next((pair for pair in exchange_pairs if pair.startswith(f"{base_currency}/")), "Unknown")
-                logging.info(f"  {exchange} ({matching_pair}): Bid: {data['bid']}, Ask: {data['ask']}")
-
-        if len(tickers) < 2:
-            logging.warning(f"Need at least two exchanges with valid tickers for {base_currency} to find an opportunity. Skipping.")
-            continue
+    @property
+    def buy_pair(self):
+        return PAIR_BY_BASE.get(self.best_ask_exchange, {}).get(self.base_currency, "Unknown")
+
+    @property
+    def sell_pair(self):
+        return PAIR_BY_BASE.get(self.best_bid_exchange, {}).get(self.base_currency, "Unknown")
+
+    @property
+    def total_fees_usd(self):
+        return self.buy_fee_amount + self.sell_fee_amount
+
+    @property
+    def buy_fee_percent(self):
+        return self.buy_fee * 100
+
+    @property
+    def sell_fee_percent(self):
+        return self.sell_fee * 100
+
+    @property
+    def required_spread(self):
+        """Gross spread in percent needed to cover both fees."""
+        return (self.buy_fee + self.sell_fee) * 100
+
+    @property
+    def spread_deficit(self):
+        """How much more gross spread in percent would be needed for profitability."""
+        return self.required_spread - self.gross_spread_percentage
+
+    def report(self, template, **fields):
+        """Renders one of the report templates for this opportunity in a single string."""
+        return template.format(
+            o=self,
+            buy_exchange=self.best_ask_exchange.upper(),
+            sell_exchange=self.best_bid_exchange.upper(),
+            **fields,
+        )
+
+    def to_record(self, timestamp, scan_number):
+        """Returns the flat dict saved to the opportunities file."""
+        return {
+            'timestamp': timestamp.isoformat(),
+            'scan_number': scan_number,
+            'base_currency': self.base_currency,
+            'buy_exchange': self.best_ask_exchange,
+            'sell_exchange': self.best_bid_exchange,
+            'buy_pair': self.buy_pair,
+            'sell_pair': self.sell_pair,
+            'buy_price': self.best_ask,
+            'sell_price': self.best_bid,
+            'buy_fee_percent': self.buy_fee_percent,
+            'sell_fee_percent': self.sell_fee_percent,
+            'gross_spread_percent': self.gross_spread_percentage,
+            'net_profit_usd': self.net_profit_usd,
+            'net_profit_percent': self.net_profit_percentage,
+            'trade_amount_usd': self.trade_amount_usd,
+            'crypto_units': self.crypto_units_bought,
+            'total_fees_usd': self.total_fees_usd,
+        }
+
+
+def simulate_trade(base_currency, best_bid_exchange, best_bid, best_ask_exchange, best_ask, trade_amount_usd):
+    """
+    Simulates buying on the best ask and selling on the best bid with exact decimal arithmetic,
+    so opportunities right at the break-even point are not misjudged by float rounding.
+    Returns an Opportunity.
+    """
+    with decimal.localcontext(DECIMAL_CONTEXT):
+        # Get the taker fee for both exchanges, default to 0 if not in config
+        buy_fee = DECIMAL_FEES.get(best_ask_exchange, Decimal(0))
+        sell_fee = DECIMAL_FEES.get(best_bid_exchange, Decimal(0))
+        bid = Decimal(str(best_bid))
+        ask = Decimal(str(best_ask))
+        amount = Decimal(trade_amount_usd)
 
-        # Find the best (highest) bid and best (lowest) ask across all exchanges
-        best_bid_exchange = max(tickers, key=lambda x: tickers[x]['bid'])
-        best_ask_exchange = min(tickers, key=lambda x: tickers[x]['ask'])
-        best_bid = tickers[best_bid_exchange]['bid']
-        best_ask = tickers[best_ask_exchange]['ask']
-
-        # --- Comprehensive Net Profit Simulation ---
-        # Simulate a real arbitrage trade with actual dollar amounts
-        trade_amount_usd = 10000  # Simulate with $10,000 investment
-        
-        # Get the taker fee for both exchanges, default to 0.0 if not in config
-        buy_fee = EXCHANGE_FEES.get(best_ask_exchange, 0.0)
-        sell_fee = EXCHANGE_FEES.get(best_bid_exchange, 0.0)
-
-        # Calculate the actual trade execution
         # 1. Buy on the cheaper exchange (pay ask price + fees)
-        effective_buy_price = best_ask * (1 + buy_fee)
-        crypto_units_bought = trade_amount_usd / effective_buy_price
+        effective_buy_price = ask * (1 + buy_fee)
+        effective_sell_price = bid * (1 - sell_fee)
+        crypto_units_bought = amount / effective_buy_price
         total_buy_cost = crypto_units_bought * effective_buy_price
-        buy_fee_amount = crypto_units_bought * best_ask * buy_fee
-        
+        buy_fee_amount = crypto_units_bought * ask * buy_fee
+
         # 2. Sell on the more expensive exchange (receive bid price - fees)
-        gross_sell_revenue = crypto_units_bought * best_bid
+        gross_sell_revenue = crypto_units_bought * bid
         sell_fee_amount = gross_sell_revenue * sell_fee
         net_sell_revenue = gross_sell_revenue - sell_fee_amount
-        
-        # 3. Calculate net profit
+
+        # 3. Net profit, and the gross spread for comparison
         net_profit_usd = net_sell_revenue - total_buy_cost
-        net_profit_percentage = (net_profit_usd / trade_amount_usd) * 100
-        
-        # 4. Calculate gross spread for comparison
-        gross_spread_percentage = ((best_bid - best_ask) / best_ask) * 100
+        net_profit_percentage = net_profit_usd / amount * 100
+        gross_spread_percentage = (bid - ask) / ask * 100
+
+        # Selling after fees must yield more than buying after fees costs
+        profitable = effective_sell_price > effective_buy_price
+
+    return Opportunity(
+        base_currency, best_bid_exchange, best_bid, best_ask_exchange, best_ask, trade_amount_usd,
+        float(buy_fee), float(sell_fee), float(effective_buy_price), float(effective_sell_price),
+        float(crypto_units_bought), float(total_buy_cost), float(buy_fee_amount), float(net_sell_revenue),
+        float(sell_fee_amount), float(net_profit_usd), float(net_profit_percentage),
+        float(gross_spread_percentage), profitable,
+    )
+
+
+def scan_prices(prices_by_exchange, trade_amount_usd=TRADE_AMOUNT_USD):
+    """
+    The scan shared by both scan modes: finds the best bid and ask for every base currency
+    at once and simulates the trade. Prices are laid out as (base currency x exchange)
+    matrices so the best legs are picked with two numpy reductions.
+    Returns one entry per BASE_CURRENCIES item: an Opportunity, or None when fewer than two
+    exchanges have prices.
+    """
+    bids = np.full((len(BASE_CURRENCIES), len(EXCHANGES)), -np.inf)
+    asks = np.full((len(BASE_CURRENCIES), len(EXCHANGES)), np.inf)
+    for i, j, exchange_name, pair in PLAN:
+        data = prices_by_exchange.get(exchange_name, {}).get(pair)
+        if data:
+            bids[i, j] = data['bid']
+            asks[i, j] = data['ask']
+
+    rows = np.arange(len(BASE_CURRENCIES))
+    # argmax/argmin keep the first exchange on ties, like a strict comparison loop would
+    best_bid_index = bids.argmax(axis=1)
+    best_ask_index = asks.argmin(axis=1)
+    valid = (np.isfinite(bids).sum(axis=1) >= 2).tolist()
+
+    opportunities = []
+    for base_currency, is_valid, bid_index, best_bid, ask_index, best_ask in zip(
+        BASE_CURRENCIES, valid, best_bid_index.tolist(), bids[rows, best_bid_index].tolist(),
+        best_ask_index.tolist(), asks[rows, best_ask_index].tolist(),
+    ):
+        opportunities.append(simulate_trade(
+            base_currency, EXCHANGES[bid_index], best_bid, EXCHANGES[ask_index], best_ask, trade_amount_usd
+        ) if is_valid else None)
+    return opportunities
+
+
+async def fetch_prices_by_exchange():
+    """
+    Fetches bid/ask prices for every pair in the scan plan across all exchanges
+    in a single concurrent wave, one request per SYMBOLS_BY_EXCHANGE group.
+    Returns a dict of exchange_name -> {symbol: {'bid': ..., 'ask': ...}}.
+    """
+    exchanges = get_exchanges(SYMBOLS_BY_EXCHANGE)
+
+    await load_exchange_markets(exchanges)
+    results = await asyncio.gather(*(
+        fetch_tickers_cached(exchange, key[0], SYMBOLS_BY_EXCHANGE[key])
+        for key, exchange in exchanges.items()
+    ))
+
+    prices_by_exchange = {}
+    for (exchange_name, _), prices in zip(exchanges, results):
+        prices_by_exchange.setdefault(exchange_name, {}).update(prices)
+    return prices_by_exchange
+
+
+def update_latest(exchange_name, tickers):
+    """
+    Stores the bid/ask of every complete ticker in LATEST, stamped with the receive time.
+    Websocket responses repeat every cached ticker, so a ticker is only stamped again when its
+    bid, ask or exchange timestamp changed; a stalled symbol then ages out of the scans.
+    """
+    latest = LATEST.setdefault(exchange_name, {})
+    now = time.monotonic()
+    for symbol, ticker in tickers.items():
+        if ticker and ticker.get('bid') and ticker.get('ask'):
+            previous = latest.get(symbol)
+            if (
+                previous is None
+                or previous['bid'] != ticker['bid']
+                or previous['ask'] != ticker['ask']
+                or previous['timestamp'] != ticker.get('timestamp')
+            ):
+                latest[symbol] = {'bid': ticker['bid'], 'ask': ticker['ask'], 'timestamp': ticker.get('timestamp'), 'ts': now}
+
+
+def latest_prices(max_age=TICKER_MAX_AGE):
+    """Returns the prices in LATEST that are recent enough, in the fetch_prices_by_exchange format."""
+    cutoff = time.monotonic() - max_age
+    return {
+        exchange_name: {symbol: data for symbol, data in prices.items() if data['ts'] >= cutoff}
+        for exchange_name, prices in LATEST.items()
+    }
+
+
+async def ticker_feed(exchange, exchange_name, symbols):
+    """
+    Keeps LATEST up to date for the given symbols of one exchange instance until cancelled.
+    Streams tickers over a websocket where the exchange supports it and polls the REST
+    tickers every TICKER_POLL_INTERVAL seconds otherwise.
+    """
+    use_websocket = exchange.has.get('watchTickers')
+    if not use_websocket:
+        logging.info(f"  {exchange_name} has no ticker websocket, polling every {TICKER_POLL_INTERVAL}s")
+
+    while True:
+        try:
+            if not use_websocket:
+                update_latest(exchange_name, await fetch_tickers_cached(exchange, exchange_name, symbols))
+                await asyncio.sleep(TICKER_POLL_INTERVAL)
+                continue
+
+            update_latest(exchange_name, await exchange.watch_tickers(symbols))
+        except ccxt.NetworkError as e:
+            logging.warning(f"  Ticker stream for {exchange_name} interrupted: {e}. Reconnecting...")
+            await asyncio.sleep(TICKER_RECONNECT_DELAY)
+        except ccxt.BaseError as e:
+            if use_websocket:
+                logging.error(f"  Ticker stream for {exchange_name} failed: {e}. Falling back to polling.")
+                use_websocket = False
+            else:
+                logging.error(f"  Ticker polling for {exchange_name} failed: {e}. Retrying...")
+                await asyncio.sleep(TICKER_RECONNECT_DELAY)
+        except Exception:
+            # The feeds are gathered with return_exceptions, an escaped error would end the feed silently
+            logging.exception(f"  Ticker feed for {exchange_name} failed unexpectedly. Restarting...")
+            await asyncio.sleep(TICKER_RECONNECT_DELAY)
+
+
+async def start_ticker_feeds():
+    """
+    Seeds LATEST with one REST snapshot, then starts a background ticker feed per
+    (exchange, market type) group. Returns the feed tasks; the caller cancels them.
+    """
+    for exchange_name, prices in (await fetch_prices_by_exchange()).items():
+        update_latest(exchange_name, prices)
+
+    return [
+        asyncio.create_task(ticker_feed(exchange, key[0], SYMBOLS_BY_EXCHANGE[key]))
+        for key, exchange in get_exchanges(SYMBOLS_BY_EXCHANGE).items()
+    ]
+
+
+async def scan_for_arbitrage(close_exchanges=True):
+    """
+    Scans for arbitrage opportunities by fetching live ticker data concurrently.
+    Groups by base currency to compare across different quote currencies (USDT vs USD).
+    Callers running repeated scans in one event loop pass close_exchanges=False to keep
+    the pooled connections open between scans, and call close_all_exchanges when done.
+    """
+    logging.info("Starting asynchronous arbitrage scan for live ticker data...")
+
+    try:
+        prices_by_exchange = await fetch_prices_by_exchange()
+    finally:
+        if close_exchanges:
+            # A single scan owns the pool, the instances must not outlive its event loop
+            await close_all_exchanges()
+
+    # --- Comprehensive Net Profit Simulation ---
+    # Simulate a real arbitrage trade with actual dollar amounts
+    opportunities = scan_prices(prices_by_exchange)
+
+    for base_currency, opportunity in zip(BASE_CURRENCIES, opportunities):
+        logging.info(f"--- Scanning for {base_currency} ---")
+
+        for exchange_name in EXCHANGES:
+            matching_pair = PAIR_BY_BASE.get(exchange_name, {}).get(base_currency)
+            data = prices_by_exchange.get(exchange_name, {}).get(matching_pair)
+            if data:
+                logging.info(f"  {exchange_name} ({matching_pair}): Bid: {data['bid']}, Ask: {data['ask']}")
+
+        if opportunity is None:
+            logging.warning(f"Need at least two exchanges with valid tickers for {base_currency} to find an opportunity. Skipping.")
+            continue
 
         # Check if arbitrage opportunity exists (positive net profit)
-        if net_profit_usd > 0:
-            # Get the trading pairs for display
-            buy_pair = next((pair for pair in EXCHANGE_TRADING_PAIRS.get(best_ask_exchange, []) if pair.startswith(f"{base_currency}/")), "Unknown")
-            sell_pair = next((pair for pair in EXCHANGE_TRADING_PAIRS.get(best_bid_exchange, []) if pair.startswith(f"{base_currency}/")), "Unknown")
-            
-            print("\n" + "="*70)
-            print(f"  !!! ARBITRAGE OPPORTUNITY DETECTED for {base_currency} !!!")
-            print("="*70)
-            print(f"  TRADE SIMULATION (${trade_amount_usd:,.0f} investment):")
-            print("-" * 70)
-            print(f"  BUY:  {crypto_units_bought:.6f} {base_currency} on {best_ask_exchange.upper():<10} ({buy_pair})")
-            print(f"        Price: ${best_ask:,.2f} + {buy_fee*100:.2f}% fee = ${effective_buy_price:,.2f}")
-            print(f"        Cost:  ${total_buy_cost:,.2f} (including ${buy_fee_amount:,.2f} fee)")
-            print()
-            print(f"  SELL: {crypto_units_bought:.6f} {base_currency} on {best_bid_exchange.upper():<10} ({sell_pair})")
-            print(f"        Price: ${best_bid:,.2f} - {sell_fee*100:.2f}% fee = ${best_bid*(1-sell_fee):,.2f}")
-            print(f"        Revenue: ${net_sell_revenue:,.2f} (after ${sell_fee_amount:,.2f} fee)")
-            print("-" * 70)
-            print(f"  PROFIT ANALYSIS:")
-            print(f"  Gross Spread:     {gross_spread_percentage:+.4f}%")
-            print(f"  Net Profit:       ${net_profit_usd:+.2f} ({net_profit_percentage:+.4f}%)")
-            print(f"  Total Fees Paid:  ${buy_fee_amount + sell_fee_amount:.2f}")
-            print(f"  Break-even at:    {((buy_fee + sell_fee) * 100):.3f}% spread")
-            print("="*70 + "\n")
+        if opportunity.profitable:
+            print(opportunity.report(OPPORTUNITY_REPORT))
         else:
-            # Calculate how much spread would be needed for profitability
-            required_spread = (buy_fee + sell_fee) * 100
-            spread_deficit = required_spread - gross_spread_percentage
-            
-            logging.info(f"No profitable arbitrage opportunity found for {base_currency}.")
-            logging.info(f"  Current spread: {gross_spread_percentage:.4f}% | Required: {required_spread:.3f}% | Deficit: {spread_deficit:.3f}%")
-            logging.info(f"  Best Bid: ${best_bid:.2f} ({best_bid_exchange}) | Best Ask: ${best_ask:.2f} ({best_ask_exchange})")
-            logging.info(f"  Simulated loss: ${net_profit_usd:.2f} on ${trade_amount_usd} investment")
+            logging.info(opportunity.report(NO_OPPORTUNITY_REPORT))
 
 async def scan_continuously(scan_interval=15):
     """
@@ -251,148 +760,115 @@ async def scan_continuously(scan_interval=15):
     Args:
         scan_interval (int): Time in seconds between scans (default: 15)
     """
+    global _opportunity_queue
     scan_count = 0
     opportunities_found = 0
     
-    # Start logging to file
-    start_logging()
+    # Start logging to stdout and file
+    scan_log_handlers = start_scan_log()
     
-    log_print("\n" + "="*80)
-    log_print("🚀 CRYPTO ARBITRAGE SCANNER - CONTINUOUS MODE")
-    log_print("="*80)
-    log_print(f"📊 Monitoring: 11 cryptocurrencies across {len(EXCHANGES)} exchanges")
-    log_print(f"💰 Pairs: BTC, ETH, SOL, XRP, ADA, DOT, UNI, AAVE, LINK, XLM, SHIB")
-    log_print(f"⏱️  Scan interval: {scan_interval} seconds")
-    log_print(f"💾 Saving opportunities to: {OPPORTUNITIES_FILE}")
-    log_print(f"📝 Saving output log to: {SCANNER_LOG_FILE}")
-    log_print(f"🛑 Press Ctrl+C to stop")
-    log_print("="*80 + "\n")
+    scan_logger.info("\n" + "="*80)
+    scan_logger.info("🚀 CRYPTO ARBITRAGE SCANNER - CONTINUOUS MODE")
+    scan_logger.info("="*80)
+    scan_logger.info(f"📊 Monitoring: {len(BASE_CURRENCIES)} cryptocurrencies across {len(EXCHANGES)} exchanges")
+    scan_logger.info(f"💰 Pairs: {', '.join(BASE_CURRENCIES)}")
+    scan_logger.info(f"⏱️  Scan interval: {scan_interval} seconds")
+    scan_logger.info(f"💾 Saving opportunities to: {OPPORTUNITIES_FILE}")
+    scan_logger.info(f"📝 Saving output log to: {SCANNER_LOG_FILE}")
+    scan_logger.info(f"🛑 Press Ctrl+C to stop")
+    scan_logger.info("="*80 + "\n")
     
+    feeds = []
+
+    # Opportunities are written by a background task so the scans never touch the file
+    _opportunity_queue = asyncio.Queue()
+    writer = asyncio.create_task(opportunity_writer(_opportunity_queue))
+
     try:
+        # Keep live prices streaming in the background, each scan only reads them
+        feeds = await start_ticker_feeds()
+
+        # Scans start on a fixed cadence from this deadline, so slow scans do not push later ones back
+        loop = asyncio.get_running_loop()
+        next_deadline = loop.time()
+
         while True:
             scan_count += 1
             current_time = datetime.now()
             
             # Display scan header
-            log_print(f"\n🔍 SCAN #{scan_count} - {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            log_print("-" * 60)
+            scan_logger.info(f"\n🔍 SCAN #{scan_count} - {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            scan_logger.info("-" * 60)
             
             # Track opportunities in this scan
             scan_opportunities = 0
             
+            # Snapshot the live prices and simulate the trade for every base currency at once
+            opportunities = scan_prices(latest_prices())
+
             # Run the arbitrage scan
-            for base_currency in ['BTC', 'ETH', 'SOL', 'XRP', 'ADA', 'DOT', 'UNI', 'AAVE', 'LINK', 'XLM', 'SHIB']:
-                # Create tasks to fetch tickers for this base currency from all exchanges
-                tasks = []
-                for exchange_name in EXCHANGES:
-                    if exchange_name in EXCHANGE_TRADING_PAIRS:
-                        # Find the appropriate trading pair for this exchange
-                        exchange_pairs = EXCHANGE_TRADING_PAIRS[exchange_name]
-                        matching_pair = next((pair for pair in exchange_pairs if pair.startswith(f"{base_currency}/")), None)
-                        if matching_pair:
-                            tasks.append(fetch_ticker_for_exchange(exchange_name, matching_pair))
-                
-                # Run all tasks and gather results
-                results = await asyncio.gather(*tasks)
-
-                # Filter out failed requests and build the tickers dictionary
-                tickers = {}
-                for result in results:
-                    if result and len(result) == 2:
-                        exchange, data = result
-                        tickers[exchange] = data
-
-                if len(tickers) < 2:
-                    log_print(f"⚠️  {base_currency}: Insufficient data (need 2+ exchanges)")
+            for base_currency, opportunity in zip(BASE_CURRENCIES, opportunities):
+                if opportunity is None:
+                    scan_logger.info(f"⚠️  {base_currency}: Insufficient data (need 2+ exchanges)")
                     continue
 
-                # Find the best (highest) bid and best (lowest) ask across all exchanges
-                best_bid_exchange = max(tickers, key=lambda x: tickers[x]['bid'])
-                best_ask_exchange = min(tickers, key=lambda x: tickers[x]['ask'])
-                best_bid = tickers[best_bid_exchange]['bid']
-                best_ask = tickers[best_ask_exchange]['ask']
-
-                # Calculate net profit simulation
-                trade_amount_usd = 10000
-                buy_fee = EXCHANGE_FEES.get(best_ask_exchange, 0.0)
-                sell_fee = EXCHANGE_FEES.get(best_bid_exchange, 0.0)
-                
-                effective_buy_price = best_ask * (1 + buy_fee)
-                crypto_units_bought = trade_amount_usd / effective_buy_price
-                total_buy_cost = crypto_units_bought * effective_buy_price
-                buy_fee_amount = crypto_units_bought * best_ask * buy_fee
-                
-                gross_sell_revenue = crypto_units_bought * best_bid
-                sell_fee_amount = gross_sell_revenue * sell_fee
-                net_sell_revenue = gross_sell_revenue - sell_fee_amount
-                
-                net_profit_usd = net_sell_revenue - total_buy_cost
-                net_profit_percentage = (net_profit_usd / trade_amount_usd) * 100
-                gross_spread_percentage = ((best_bid - best_ask) / best_ask) * 100
-
-                if net_profit_usd > 0:
+                o = opportunity
+                if o.profitable:
                     # Profitable opportunity found!
                     scan_opportunities += 1
                     opportunities_found += 1
-                    
-                    buy_pair = next((pair for pair in EXCHANGE_TRADING_PAIRS.get(best_ask_exchange, []) if pair.startswith(f"{base_currency}/")), "Unknown")
-                    sell_pair = next((pair for pair in EXCHANGE_TRADING_PAIRS.get(best_bid_exchange, []) if pair.startswith(f"{base_currency}/")), "Unknown")
-                    
-                    # Create opportunity data for saving
-                    opportunity_data = {
-                        'timestamp': current_time.isoformat(),
-                        'scan_number': scan_count,
-                        'base_currency': base_currency,
-                        'buy_exchange': best_ask_exchange,
-                        'sell_exchange': best_bid_exchange,
-                        'buy_pair': buy_pair,
-                        'sell_pair': sell_pair,
-                        'buy_price': best_ask,
-                        'sell_price': best_bid,
-                        'buy_fee_percent': buy_fee * 100,
-                        'sell_fee_percent': sell_fee * 100,
-                        'gross_spread_percent': gross_spread_percentage,
-                        'net_profit_usd': net_profit_usd,
-                        'net_profit_percent': net_profit_percentage,
-                        'trade_amount_usd': trade_amount_usd,
-                        'crypto_units': crypto_units_bought,
-                        'total_fees_usd': buy_fee_amount + sell_fee_amount
-                    }
-                    
+
                     # Save to file
-                    save_opportunity_to_file(opportunity_data)
-                    
+                    save_opportunity_to_file(o.to_record(current_time, scan_count))
+
                     # Display opportunity
-                    log_print(f"\n💰 OPPORTUNITY #{opportunities_found}: {base_currency}")
-                    log_print(f"   Buy:  ${best_ask:,.2f} on {best_ask_exchange.upper()} ({buy_pair})")
-                    log_print(f"   Sell: ${best_bid:,.2f} on {best_bid_exchange.upper()} ({sell_pair})")
-                    log_print(f"   Profit: ${net_profit_usd:+.2f} ({net_profit_percentage:+.3f}%) on ${trade_amount_usd}")
-                    log_print(f"   Spread: {gross_spread_percentage:.3f}% | Fees: ${buy_fee_amount + sell_fee_amount:.2f}")
+                    scan_logger.info(o.report(CONTINUOUS_OPPORTUNITY_REPORT, number=opportunities_found))
                 else:
                     # No opportunity
-                    required_spread = (buy_fee + sell_fee) * 100
-                    log_print(f"📊 {base_currency}: ${best_ask:.0f}-${best_bid:.0f} | Spread: {gross_spread_percentage:.3f}% (need {required_spread:.3f}%)")
-            
+                    scan_logger.info(f"📊 {base_currency}: ${o.best_ask:.0f}-${o.best_bid:.0f} | Spread: {o.gross_spread_percentage:.3f}% (need {o.required_spread:.3f}%)")
+
             # Scan summary
             if scan_opportunities > 0:
-                log_print(f"\n✅ Found {scan_opportunities} opportunities in this scan!")
+                scan_logger.info(f"\n✅ Found {scan_opportunities} opportunities in this scan!")
             else:
-                log_print(f"\n❌ No opportunities found in scan #{scan_count}")
+                scan_logger.info(f"\n❌ No opportunities found in scan #{scan_count}")
             
-            log_print(f"📈 Total opportunities found: {opportunities_found}")
-            log_print(f"⏰ Next scan in {scan_interval} seconds...\n")
+            scan_logger.info(f"📈 Total opportunities found: {opportunities_found}")
+
+            next_deadline += scan_interval
+            delay = next_deadline - loop.time()
+            if delay < -scan_interval:
+                # More than a whole interval behind: start again from now rather than
+                # running a burst of back-to-back scans to catch up
+                logging.warning(f"Scan #{scan_count} overran the scan interval by {-delay:.1f}s, skipping missed scans")
+                next_deadline = loop.time()
+            delay = max(0, delay)
+            scan_logger.info(f"⏰ Next scan in {delay:.1f} seconds...\n")
             
+            # Write this scan's output to the log file in one go
+            flush_scan_log()
+
             # Wait for next scan
-            await asyncio.sleep(scan_interval)
+            await asyncio.sleep(delay)
             
     except KeyboardInterrupt:
-        log_print("\n\n🛑 Scanner stopped by user")
-        log_print(f"📊 Final Stats:")
-        log_print(f"   Total scans: {scan_count}")
-        log_print(f"   Opportunities found: {opportunities_found}")
-        log_print(f"   Opportunities saved to: {OPPORTUNITIES_FILE}")
-        log_print(f"   Output log saved to: {SCANNER_LOG_FILE}")
-        log_print("\nThank you for using the Crypto Arbitrage Scanner! 🚀\n")
-        
-        # Stop logging to file
-        stop_logging()
+        scan_logger.info("\n\n🛑 Scanner stopped by user")
+        scan_logger.info(f"📊 Final Stats:")
+        scan_logger.info(f"   Total scans: {scan_count}")
+        scan_logger.info(f"   Opportunities found: {opportunities_found}")
+        scan_logger.info(f"   Opportunities saved to: {OPPORTUNITIES_FILE}")
+        scan_logger.info(f"   Output log saved to: {SCANNER_LOG_FILE}")
+        scan_logger.info("\nThank you for using the Crypto Arbitrage Scanner! 🚀\n")
+    finally:
+        # Stop the feeds and release the pooled connections however the loop ends
+        for feed in feeds:
+            feed.cancel()
+        await asyncio.gather(*feeds, return_exceptions=True)
+        await close_all_exchanges()
+        LATEST.clear()
+        # The writer drains the queue when cancelled
+        writer.cancel()
+        await asyncio.gather(writer, return_exceptions=True)
+        _opportunity_queue = None
+        # Stop logging to stdout and file
+        stop_scan_log(scan_log_handlers)
@@ -0,0 +1,84 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the kernel runs as plain Python over the same arrays
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+# Source of the scan kernel. {unrolled} is filled with one comparison block per exchange
+# column after the first, which finds the best ask and bid of the bar without argmin/argmax.
+_SCAN_TEMPLATE = '''
+def scan(prices, profit_target, exit_after_bars):
+    n_bars = prices.shape[0]
+    threshold = 1.0 + profit_target
+    entries = np.empty((n_bars, 3), dtype=np.int32)
+    exits = np.full(n_bars, -1, dtype=np.int32)
+    n_trades = 0
+    in_position = False
+    entry_bar = 0
+    long_index = 0
+    short_index = 0
+
+    for i in range(n_bars):
+        if not in_position:
+            ask_index = 0
+            bid_index = 0
+            ask = prices[i, 0]
+            bid = ask
+{unrolled}
+            if bid > ask * threshold:
+                entries[n_trades, 0] = i
+                entries[n_trades, 1] = ask_index
+                entries[n_trades, 2] = bid_index
+                n_trades += 1
+                in_position = True
+                entry_bar = i
+                long_index = ask_index
+                short_index = bid_index
+        elif prices[i, long_index] >= prices[i, short_index] or i >= entry_bar + exit_after_bars:
+            exits[n_trades - 1] = i
+            in_position = False
+
+    return entries[:n_trades].copy(), exits[:n_trades].copy()
+'''
+
+_UNROLLED_COLUMN = '''
+            price = prices[i, {j}]
+            if price < ask:
+                ask_index = {j}
+                ask = price
+            if price > bid:
+                bid_index = {j}
+                bid = price'''
+
+_scan_kernels = {}
+
+
+def make_scan(n_exchanges):
+    """
+    Returns the kernel that runs the ArbitrageStrategy entry and exit rules over a
+    (n_bars, n_exchanges) close price matrix: scan(prices, profit_target, exit_after_bars).
+    Orders are assumed to fill on the next bar, like market orders in Backtrader, so a position
+    can be closed from the bar after its entry and a new one opened from the bar after its exit.
+
+    The kernel is generated for the fixed number of exchange columns, with the argmin/argmax
+    over each row unrolled into a chain of comparisons. Strict comparisons keep the first
+    column on ties, like np.argmin and np.argmax. Kernels are compiled once per n.
+
+    The kernel returns (entries, exits):
+        entries: int32 array of (bar, ask_index, bid_index) rows, one per trade
+        exits: int32 array with the exit bar of each trade, -1 if still open at the end
+    """
+    kernel = _scan_kernels.get(n_exchanges)
+    if kernel is None:
+        unrolled = ''.join(_UNROLLED_COLUMN.format(j=j) for j in range(1, n_exchanges))
+        namespace = {'np': np}
+        exec(_SCAN_TEMPLATE.format(unrolled=unrolled), namespace)
+        # Generated source has no file to cache against, so it is compiled in-process only
+        kernel = _scan_kernels[n_exchanges] = njit(namespace['scan'])
+    return kernel
@@ -1,9 +1,42 @@
+if __name__ == '__main__':
+    # Load .env before app.config reads the environment, as main.py and scheduler.py do
+    from app.config_env import load_env_file
+    load_env_file()
+
 import backtrader as bt
+import hashlib
+import numpy as np
 import pandas as pd
 import logging
-from app.database.database import get_session
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from sqlalchemy import case, func, select
+from app.database.database import engine, get_session
 from app.models.market_data import MarketData
 from app.config import EXCHANGES, TRADING_PAIRS
+from app.simulators import _arb_kernel
+
+try:
+    import pyarrow  # Optional, needed for the parquet price matrix cache
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Broker settings shared by both backtest engines
+INITIAL_CASH = 100000.0
+# Commission per fill as a fraction of its value (a realistic 0.1% per trade)
+COMMISSION = 0.001
+# Quote amount bought on the long leg of each trade, the short leg sells the same number of units.
+# Sizing by value rather than one unit keeps the legs fundable at any price level, one BTC
+# costs more than INITIAL_CASH and the broker would reject the buy leg for lack of cash.
+TRADE_AMOUNT = 10000.0
+
+# Aligned price matrices saved by load_price_matrix, one file per symbol, reused while the symbol's history is unchanged
+PRICE_MATRIX_CACHE_DIR = Path.home() / '.cache' / 'crypto_arb' / 'price_matrix'
+# Parquet metadata key holding the history stamp a cached price matrix was built from
+PRICE_MATRIX_STAMP_KEY = b'crypto_arb_history_stamp'
 
 # --- 1. The Arbitrage Strategy ---
 class ArbitrageStrategy(bt.Strategy):
@@ -12,11 +45,33 @@ class ArbitrageStrategy(bt.Strategy):
         ('profit_target', 0.002), # 0.2%
         # How many bars to wait before exiting if prices don't converge
         ('exit_after_bars', 10),
+        # Quote amount of each leg, the number of units is set from the long leg's price
+        ('trade_amount', TRADE_AMOUNT),
+        # Optional (entries, exits) from an _arb_kernel.make_scan kernel over the same feeds.
+        # When given, the strategy only places the precomputed orders and Backtrader does the accounting.
+        # The kernel assumes every order fills, so leave it unset if orders can be rejected.
+        ('trades', None),
     )
 
     def __init__(self):
-        # Keep a dictionary of close prices for each data feed, keyed by the data feed's name
-        self.prices = {d._name: d.close for d in self.datas}
+        self._names = [d._name for d in self.datas]
+        # Raw storage of the close lines, indexed by bar number. Reading them directly skips
+        # the LineBuffer ago-offset translation of close[0] on every access.
+        self._arrays = [d.close.array for d in self.datas]
+        # Current close of every feed in self.datas order, refilled each bar so the
+        # best legs are found with one argmin/argmax
+        self._buf = np.empty(len(self.datas), dtype=np.float64)
+        # Parameters read on every bar, resolved once instead of through the params descriptor
+        self._threshold = 1.0 + float(self.p.profit_target)
+        self._exit_after_bars = int(self.p.exit_after_bars)
+
+        # Precomputed trades keyed by bar index
+        self._entries_by_bar = {}
+        self._exit_bars = set()
+        if self.p.trades is not None:
+            entries, exits = self.p.trades
+            self._entries_by_bar = {bar: (ask_index, bid_index) for bar, ask_index, bid_index in entries.tolist()}
+            self._exit_bars = set(exits.tolist())
         
         # Order tracking
         self.buy_order = None
@@ -25,11 +80,20 @@ class ArbitrageStrategy(bt.Strategy):
         # State for the open arbitrage position
         self.long_on_exchange = None
         self.short_on_exchange = None
+        self._long_index = None
+        self._short_index = None
+
+        # (datetime, text) log events, written out in one go when the backtest stops
+        self._events = []
 
     def log(self, txt, dt=None):
         ''' Logging function for this strategy'''
-        dt = dt or self.datas[0].datetime.datetime(0)
-        print(f'{dt.strftime("%Y-%m-%d %H:%M:%S")} - {txt}')
+        self._events.append((dt or self.datas[0].datetime.datetime(0), txt))
+
+    def stop(self):
+        # Formatting and writing the events here keeps strftime and stdout out of next()
+        sys.stdout.writelines(f'{dt:%Y-%m-%d %H:%M:%S} - {txt}\n' for dt, txt in self._events)
+        self._events.clear()
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -52,6 +116,16 @@ class ArbitrageStrategy(bt.Strategy):
             else: self.sell_order = None
 
     def next(self):
+        bar = len(self) - 1
+        if self.p.trades is not None:
+            # The kernel already decided on which bars to trade
+            legs = self._entries_by_bar.get(bar)
+            if legs is not None:
+                self.enter(*legs)
+            elif bar in self._exit_bars:
+                self.check_exit(force=True)
+            return
+
         # If an order is pending, do not send another
         if self.buy_order or self.sell_order:
             return
@@ -61,88 +135,340 @@ class ArbitrageStrategy(bt.Strategy):
 
         if not in_position:
             # Find the best ask (lowest price to buy) and best bid (highest price to sell)
-            ask_exchange = min(self.prices, key=self.prices.get)
-            bid_exchange = max(self.prices, key=self.prices.get)
-
-            ask_price = self.prices[ask_exchange][0]
-            bid_price = self.prices[bid_exchange][0]
+            buf = self._buf
+            for i, array in enumerate(self._arrays):
+                buf[i] = array[bar]
+            # argmin/argmax return the first feed on ties, like min()/max() did
+            ask_index = int(buf.argmin())
+            bid_index = int(buf.argmax())
 
             # Arbitrage condition: can we sell for more than we buy, considering the profit target?
-            if bid_price > ask_price * (1 + self.p.profit_target):
-                self.log(f'!!! ARBITRAGE DETECTED !!!')
-                self.log(f'BUY on {ask_exchange} @ {ask_price:.2f}')
-                self.log(f'SELL on {bid_exchange} @ {bid_price:.2f}')
-
-                # Place BUY order on the cheaper exchange
-                self.buy_order = self.buy(data=self.getdatabyname(ask_exchange))
-                # Place SELL order on the more expensive exchange
-                self.sell_order = self.sell(data=self.getdatabyname(bid_exchange))
-
-                # Record our position state
-                self.long_on_exchange = ask_exchange
-                self.short_on_exchange = bid_exchange
-                self.entry_bar = len(self)
+            if buf[bid_index] > buf[ask_index] * self._threshold:
+                self.enter(ask_index, bid_index)
         else:
-            # --- ADVANCED CLOSING LOGIC ---
-            # We are in a position, so we check for exit conditions.
-            price_on_long_leg = self.prices[self.long_on_exchange][0]
-            price_on_short_leg = self.prices[self.short_on_exchange][0]
-
-            # 1. Price Convergence Exit: Close when the spread disappears or reverses
-            if price_on_long_leg >= price_on_short_leg:
-                self.log(f'Price convergence detected. Closing positions.')
-                self.close(data=self.getdatabyname(self.long_on_exchange))
-                self.close(data=self.getdatabyname(self.short_on_exchange))
-            # 2. Time-Based Exit: Close if the position has been open for too long
-            elif len(self) >= self.entry_bar + self.p.exit_after_bars:
-                self.log(f'Time-based exit after {self.p.exit_after_bars} bars. Closing positions.')
-                self.close(data=self.getdatabyname(self.long_on_exchange))
-                self.close(data=self.getdatabyname(self.short_on_exchange))
-
-# --- 2. The Backtest Runner ---
-def run_backtest(plot=False):
-    cerebro = bt.Cerebro()
+            self.check_exit()
 
-    # --- Configure Broker ---
-    cerebro.broker.setcash(100000.0)
-    # Add a realistic commission (e.g., 0.1% per trade)
-    cerebro.broker.setcommission(commission=0.001)
+    def enter(self, ask_index, bid_index):
+        """Buys on the feed at ask_index and sells on the feed at bid_index."""
+        ask_exchange = self._names[ask_index]
+        bid_exchange = self._names[bid_index]
+        bar = len(self) - 1
+        ask_price = self._arrays[ask_index][bar]
+        bid_price = self._arrays[bid_index][bar]
 
-    # --- Load and Synchronize Data ---
-    session = get_session()
-    symbol_to_test = TRADING_PAIRS[0] # Test the first pair in the config
-    logging.info(f"Loading data for {symbol_to_test} from all exchanges...")
-
-    all_data_df = {}
-    for exchange in EXCHANGES:
-        query = session.query(MarketData).filter(MarketData.exchange == exchange, MarketData.symbol == symbol_to_test).statement
-        df = pd.read_sql(query, session.bind, index_col='timestamp', parse_dates=['timestamp'])
-        if not df.empty:
-            all_data_df[exchange] = df['close'] # We only need the close price
-            logging.info(f"Loaded {len(df)} data points for {exchange}")
-
-    if len(all_data_df) < 2:
-        logging.error("Need data from at least two exchanges to run an arbitrage backtest. Aborting.")
-        return
+        self.log(f'!!! ARBITRAGE DETECTED !!!')
+        self.log(f'BUY on {ask_exchange} @ {ask_price:.2f}')
+        self.log(f'SELL on {bid_exchange} @ {bid_price:.2f}')
+
+        # Both legs trade the same number of units, worth trade_amount on the cheaper exchange
+        size = self.p.trade_amount / ask_price
+        # Place BUY order on the cheaper exchange
+        self.buy_order = self.buy(data=self.datas[ask_index], size=size)
+        # Place SELL order on the more expensive exchange
+        self.sell_order = self.sell(data=self.datas[bid_index], size=size)
+
+        # Record our position state
+        self.long_on_exchange = ask_exchange
+        self.short_on_exchange = bid_exchange
+        self._long_index = ask_index
+        self._short_index = bid_index
+        self.entry_bar = len(self)
+
+    def check_exit(self, force=False):
+        """
+        Closes both legs of the open position once an exit condition is met.
+        force closes them regardless, for exits the kernel already decided on.
+        """
+        # --- ADVANCED CLOSING LOGIC ---
+        # We are in a position, so we check for exit conditions.
+        bar = len(self) - 1
+        price_on_long_leg = self._arrays[self._long_index][bar]
+        price_on_short_leg = self._arrays[self._short_index][bar]
+
+        # 1. Price Convergence Exit: Close when the spread disappears or reverses.
+        # The kernel compares float32 prices, so on its exit bars prices that only
+        # converge at that precision count too.
+        if price_on_long_leg >= price_on_short_leg or (
+            force and len(self) < self.entry_bar + self._exit_after_bars
+        ):
+            self.log(f'Price convergence detected. Closing positions.')
+        # 2. Time-Based Exit: Close if the position has been open for too long
+        elif len(self) >= self.entry_bar + self._exit_after_bars:
+            self.log(f'Time-based exit after {self._exit_after_bars} bars. Closing positions.')
+        else:
+            return
+        self.close(data=self.datas[self._long_index])
+        self.close(data=self.datas[self._short_index])
+
+# --- 2. Loading the Price History ---
+def price_matrix_cache_path(symbol):
+    """Returns the cache file for the price matrix of a symbol on the configured exchanges."""
+    key = hashlib.sha1(f"{symbol}|{','.join(EXCHANGES)}".encode()).hexdigest()[:16]
+    return PRICE_MATRIX_CACHE_DIR / f"{key}.parquet"
+
+def price_history_stamp(symbol):
+    """
+    Returns the latest timestamp and row count of the symbol's history as bytes, or None if it
+    has no data. Any newly stored candle changes the stamp and invalidates the cached matrix.
+    """
+    query = select(func.max(MarketData.timestamp), func.count()).where(
+        MarketData.exchange.in_(EXCHANGES), MarketData.symbol == symbol
+    )
+    with get_session() as session:
+        latest_timestamp, rows = session.execute(query).one()
+    if not rows:
+        return None
+    return f"{latest_timestamp}|{rows}".encode()
+
+def load_price_matrix(symbol):
+    """
+    Loads the close prices of a symbol on every exchange, aligned by timestamp.
+    Returns a DataFrame with one column per exchange, or None if fewer than two exchanges have data.
+    With pyarrow installed the result is cached as parquet, so repeated backtests skip the query.
+    The cache file of a symbol is overwritten whenever its history changes.
+    """
+    cache_path = stamp = None
+    if pyarrow is not None:
+        cache_path = price_matrix_cache_path(symbol)
+        stamp = price_history_stamp(symbol)
+    if stamp is not None and cache_path.exists():
+        try:
+            # Only the footer is read to check the stamp, the data is read if it matches
+            metadata = pyarrow.parquet.read_schema(cache_path).metadata or {}
+            if metadata.get(PRICE_MATRIX_STAMP_KEY) == stamp:
+                combined_df = pd.read_parquet(cache_path)
+                logging.info(f"Loaded {len(combined_df)} synchronized data points for {symbol} from {cache_path}")
+                return combined_df
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read price matrix cache {cache_path}: {e}")
+
+    combined_df = query_price_matrix(symbol)
+    if combined_df is not None and stamp is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            table = pyarrow.Table.from_pandas(combined_df)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), PRICE_MATRIX_STAMP_KEY: stamp})
+            # Write next to the cache file and swap it in, so readers never see a partial file
+            tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+            pyarrow.parquet.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not write price matrix cache {cache_path}: {e}")
+    return combined_df
+
+def query_price_matrix(symbol):
+    """Queries the aligned close prices of a symbol from the database, see load_price_matrix."""
+    logging.info(f"Loading data for {symbol} from all exchanges...")
+    series_filter = (MarketData.exchange.in_(EXCHANGES), MarketData.symbol == symbol)
+
+    with get_session() as session:
+        points_by_exchange = dict(session.execute(
+            select(MarketData.exchange, func.count()).where(*series_filter).group_by(MarketData.exchange)
+        ).all())
+        exchanges = [exchange for exchange in EXCHANGES if points_by_exchange.get(exchange)]
+        for exchange in exchanges:
+            logging.info(f"Loaded {points_by_exchange[exchange]} data points for {exchange}")
+
+        if len(exchanges) < 2:
+            logging.error("Need data from at least two exchanges to run an arbitrage backtest. Aborting.")
+            return None
+
+        # One query pivots the exchanges into columns and keeps only the timestamps every exchange
+        # has a candle for, so the aligned matrix comes straight from SQLite without NaN rows to drop
+        query = select(
+            MarketData.timestamp,
+            *(func.max(case((MarketData.exchange == exchange, MarketData.close))).label(exchange) for exchange in exchanges),
+        ).where(*series_filter).group_by(MarketData.timestamp).having(
+            func.count() == len(exchanges)
+        ).order_by(MarketData.timestamp)
+        combined_df = pd.read_sql(query, session.bind, index_col='timestamp', parse_dates=['timestamp'])
 
-    # Combine all data into a single DataFrame, aligning them by timestamp
-    combined_df = pd.concat(all_data_df, axis=1)
-    combined_df.dropna(inplace=True) # Drop rows where any exchange is missing data
     logging.info(f"Combined data has {len(combined_df)} synchronized data points.")
+    return combined_df
 
-    # --- Add Data Feeds to Cerebro ---
+# --- 3. The Backtest Engines ---
+def scan_trades(combined_df, profit_target, exit_after_bars):
+    """
+    Runs the kernel over the close price matrix and returns its (entries, exits).
+    The scan only compares prices against each other and a threshold of a few basis points,
+    so it runs on float32 to halve the memory traffic; PnL is still computed in float64.
+    """
+    prices = np.ascontiguousarray(combined_df.to_numpy(), dtype=np.float32)
+    return _arb_kernel.make_scan(prices.shape[1])(prices, np.float32(profit_target), exit_after_bars)
+
+def trade_pnl_and_cash(prices, trades, fee, trade_amount):
+    """
+    Computes the trades of the kernel with the same fills as the Backtrader broker:
+    legs of trade_amount / entry bar ask units, filled at the next bar's price, commission
+    fee times the fill value, and positions still open at the end marked to the last price.
+    Returns (pnl, required_cash), the net PnL of every filled trade and the cash the
+    broker needs to accept and fill its buy leg.
+    """
+    entries, exits = trades
+    last_bar = len(prices) - 1
+
+    # Orders placed on the last bar never fill
+    entry_fill = entries[:, 0] + 1
+    filled = entry_fill <= last_bar
+    entry_bar, entry_fill, exits = entries[filled, 0], entry_fill[filled], exits[filled]
+    ask_index, bid_index = entries[filled, 1], entries[filled, 2]
+    closed = (exits >= 0) & (exits < last_bar)
+    exit_fill = np.where(closed, exits + 1, last_bar)
+
+    ask_price = prices[entry_bar, ask_index]
+    size = trade_amount / ask_price
+    long_entry, long_exit = prices[entry_fill, ask_index], prices[exit_fill, ask_index]
+    short_entry, short_exit = prices[entry_fill, bid_index], prices[exit_fill, bid_index]
+    commissions = fee * (long_entry + short_entry + np.where(closed, long_exit + short_exit, 0.0))
+    pnl = size * ((long_exit - long_entry) + (short_entry - short_exit) - commissions)
+    # The broker checks the buy leg at the order's creation price and again at the fill price
+    required_cash = size * np.maximum(ask_price, long_entry) * (1.0 + fee)
+    return pnl, required_cash
+
+def trades_are_funded(trade_pnl, required_cash, initial_cash):
+    """Returns True if the cash left before every trade covers its buy leg, so no order is rejected."""
+    # The kernel trades one position at a time, so the cash before a trade is the
+    # initial cash plus the PnL of all the trades closed before it
+    cash_before = initial_cash + np.concatenate(([0.0], np.cumsum(trade_pnl)[:-1]))
+    return bool(np.all(cash_before >= required_cash))
+
+def run_backtest_vectorized(combined_df, profit_target, fee, exit_after_bars, trade_amount=TRADE_AMOUNT, initial_cash=INITIAL_CASH):
+    """
+    Backtests ArbitrageStrategy without Cerebro, for the case of one pair on several exchanges.
+    The path dependent entry/exit rules come from the kernel, the PnL of all trades is then
+    computed in a few array operations with the same fills as the Backtrader broker.
+    Unlike the broker it assumes every order fills, a warning is logged when the cash would
+    not cover a buy leg and Backtrader would reject it.
+    Returns the net PnL of every trade.
+    """
+    prices = np.ascontiguousarray(combined_df.to_numpy(), dtype=np.float64)
+    trades = scan_trades(combined_df, profit_target, exit_after_bars)
+    trade_pnl, required_cash = trade_pnl_and_cash(prices, trades, fee, trade_amount)
+    if not trades_are_funded(trade_pnl, required_cash, initial_cash):
+        logging.warning(
+            "Cash runs short for some trades, Backtrader would reject their buy legs. "
+            "The vectorized results assume every order fills, use engine=cerebro for the broker's."
+        )
+    return trade_pnl
+
+def make_feeds(combined_df):
+    """Builds one Backtrader PandasData feed per exchange column of the price matrix."""
+    # Only close prices are known, so every feed points open/high/low/close at the same
+    # array and all feeds share one array of zero volumes instead of copying them
+    zeros = np.zeros(len(combined_df), dtype=np.float64)
+    feeds = []
     for exchange_name in combined_df.columns:
+        close = combined_df[exchange_name].to_numpy()
         # Backtrader needs a DataFrame with specific column names
-        feed_df = pd.DataFrame({'open': combined_df[exchange_name], 'high': combined_df[exchange_name], 'low': combined_df[exchange_name], 'close': combined_df[exchange_name], 'volume': 0})
-        data_feed = bt.feeds.PandasData(dataname=feed_df, name=exchange_name)
+        feed_df = pd.DataFrame(
+            {'open': close, 'high': close, 'low': close, 'close': close, 'volume': zeros},
+            index=combined_df.index, copy=False,
+        )
+        feeds.append(bt.feeds.PandasData(dataname=feed_df, name=exchange_name))
+    return feeds
+
+# Feeds built by load_feeds, symbol -> (price_history_stamp, feeds)
+_feeds_by_symbol = {}
+
+def load_feeds(symbol):
+    """
+    Returns the data feeds of a symbol, or None without enough data. The price matrix query and
+    the feeds are built once per symbol, so parameter sweeps only pay for the backtests.
+    They are built again when the stored history changes, like the price matrix cache.
+    """
+    stamp = price_history_stamp(symbol)
+    cached = _feeds_by_symbol.get(symbol)
+    if cached is None or cached[0] != stamp:
+        combined_df = load_price_matrix(symbol)
+        if combined_df is None:
+            _feeds_by_symbol.pop(symbol, None)
+            return None
+        _feeds_by_symbol[symbol] = (stamp, make_feeds(combined_df))
+    return _feeds_by_symbol[symbol][1]
+
+def run_with(feeds, **strategy_params):
+    """
+    Backtests ArbitrageStrategy with Backtrader on the given feeds. Returns the Cerebro instance after the run.
+    Each run resets and preloads the feeds again, so the same feeds can be reused run after run.
+    """
+    cerebro = bt.Cerebro()
+
+    # --- Configure Broker ---
+    cerebro.broker.setcash(INITIAL_CASH)
+    cerebro.broker.setcommission(commission=COMMISSION)
+
+    # --- Add Data Feeds to Cerebro ---
+    for data_feed in feeds:
         cerebro.adddata(data_feed)
 
+    # --- Find the trades with the compiled kernel, Cerebro only does the accounting ---
+    profit_target = strategy_params.get('profit_target', ArbitrageStrategy.params.profit_target)
+    exit_after_bars = strategy_params.get('exit_after_bars', ArbitrageStrategy.params.exit_after_bars)
+    trade_amount = strategy_params.get('trade_amount', ArbitrageStrategy.params.trade_amount)
+    combined_df = pd.DataFrame({data_feed.p.name: data_feed.p.dataname['close'] for data_feed in feeds})
+    trades = scan_trades(combined_df, profit_target, exit_after_bars)
+    logging.info(f"Kernel found {len(trades[0])} arbitrage trades.")
+
+    # The kernel assumes every order fills, when the broker would reject one the strategy decides bar by bar
+    prices = np.ascontiguousarray(combined_df.to_numpy(), dtype=np.float64)
+    if not trades_are_funded(*trade_pnl_and_cash(prices, trades, COMMISSION, trade_amount), INITIAL_CASH):
+        logging.warning("Cash runs short for some kernel trades, letting the strategy decide bar by bar.")
+        trades = None
+
     # --- Add Strategy and Run ---
-    cerebro.addstrategy(ArbitrageStrategy)
-    initial_portfolio_value = cerebro.broker.getvalue()
-    print("Running backtest...")
+    cerebro.addstrategy(ArbitrageStrategy, trades=trades, **strategy_params)
     cerebro.run()
-    final_portfolio_value = cerebro.broker.getvalue()
+    return cerebro
+
+def run_backtest_cerebro(combined_df):
+    """Backtests ArbitrageStrategy with Backtrader. Returns the Cerebro instance after the run."""
+    return run_with(make_feeds(combined_df))
+
+def run_parameter_sweep(symbol, profit_targets, exit_after_bars_values=(ArbitrageStrategy.params.exit_after_bars,)):
+    """
+    Backtests one symbol for every (profit_target, exit_after_bars) combination on the same feeds.
+    Returns a dict of (profit_target, exit_after_bars) -> pnl, or None without enough data.
+    """
+    feeds = load_feeds(symbol)
+    if feeds is None:
+        return None
+    results = {}
+    for profit_target in profit_targets:
+        for exit_after_bars in exit_after_bars_values:
+            cerebro = run_with(feeds, profit_target=profit_target, exit_after_bars=exit_after_bars)
+            results[(profit_target, exit_after_bars)] = cerebro.broker.getvalue() - INITIAL_CASH
+    return results
+
+# --- 4. The Backtest Runner ---
+def run_backtest(plot=False, engine='vectorized'):
+    """
+    Backtests the arbitrage strategy on the first configured pair.
+    engine is 'vectorized' (numpy, default) or 'cerebro' (Backtrader); plotting needs Cerebro.
+    """
+    if plot and engine != 'cerebro':
+        logging.info("Plotting needs the Backtrader engine, using engine=cerebro.")
+        engine = 'cerebro'
+
+    # --- Load and Synchronize Data ---
+    symbol_to_test = TRADING_PAIRS[0] # Test the first pair in the config
+    combined_df = load_price_matrix(symbol_to_test)
+    if combined_df is None:
+        return
+
+    initial_portfolio_value = INITIAL_CASH
+    print("Running backtest...")
+    if engine == 'cerebro':
+        cerebro = run_backtest_cerebro(combined_df)
+        final_portfolio_value = cerebro.broker.getvalue()
+    else:
+        trade_pnl = run_backtest_vectorized(
+            combined_df,
+            ArbitrageStrategy.params.profit_target,
+            COMMISSION,
+            ArbitrageStrategy.params.exit_after_bars,
+        )
+        logging.info(f"Backtest made {len(trade_pnl)} arbitrage trades.")
+        final_portfolio_value = initial_portfolio_value + float(trade_pnl.sum())
     
     print("\n" + "="*40 + "\nBACKTEST RESULTS\n" + "="*40)
     print(f"Initial Portfolio Value: {initial_portfolio_value:,.2f}")
@@ -156,5 +482,47 @@ def run_backtest(plot=False):
         # Use a style that works well with multiple data feeds
         cerebro.plot(style='line', iplot=False)
 
+def _init_backtest_worker():
+    """Drops the database connections inherited from the parent, each worker opens its own."""
+    engine.dispose(close=False)
+
+def _run_single_pair(symbol):
+    """Backtests one pair with the vectorized engine. Returns a small (symbol, pnl, n_trades) tuple."""
+    combined_df = load_price_matrix(symbol)
+    if combined_df is None:
+        return symbol, None, 0
+    trade_pnl = run_backtest_vectorized(
+        combined_df,
+        ArbitrageStrategy.params.profit_target,
+        COMMISSION,
+        ArbitrageStrategy.params.exit_after_bars,
+    )
+    return symbol, float(trade_pnl.sum()), len(trade_pnl)
+
+def run_backtests_all_pairs(pairs=TRADING_PAIRS):
+    """
+    Backtests every pair in its own process, the pairs are independent so this scales with the cores.
+    Returns a dict of pair -> (pair, pnl, n_trades), pnl is None for pairs without enough data.
+    """
+    if not pairs:
+        print("No pairs to backtest.")
+        return {}
+    results = {}
+    max_workers = min(len(pairs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_backtest_worker) as executor:
+        futures = {executor.submit(_run_single_pair, pair): pair for pair in pairs}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    print("\n" + "="*50 + "\nBACKTEST RESULTS PER PAIR\n" + "="*50)
+    for pair in pairs:
+        _, pnl, n_trades = results[pair]
+        if pnl is None:
+            print(f"{pair:<16} not enough data")
+        else:
+            print(f"{pair:<16} Profit/Loss: {pnl:>12,.2f}  Trades: {n_trades}")
+    print("="*50)
+    return results
+
 if __name__ == '__main__':
     run_backtest()
\ No newline at end of file
@@ -0,0 +1,19 @@
+import asyncio
+import logging
+import sys
+
+def install_event_loop_policy():
+    """
+    Makes asyncio.run use uvloop when it is installed, which schedules the many concurrent
+    exchange requests with less overhead than the stdlib loop.
+    uvloop is optional and not available on Windows, where the selector loop is used instead.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        if sys.platform == 'win32':
+            # aiodns and some websocket clients do not work with the default proactor loop
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logging.debug("Using uvloop event loop")
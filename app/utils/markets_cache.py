@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+
+import ccxt.async_support as ccxt
+import orjson
+
+MARKETS_CACHE_DIR = Path.home() / '.cache' / 'crypto_arb'
+# Market listings change rarely, a day old manifest is still good enough to start with
+MARKETS_CACHE_TTL = 24 * 60 * 60
+
+# Keeps background refresh tasks referenced until they finish
+_refresh_tasks = set()
+
+def markets_cache_path(exchange):
+    """Returns the cache file for an exchange instance, one per market type."""
+    default_type = exchange.options.get('defaultType')
+    suffix = f"_{default_type}" if default_type else ''
+    return MARKETS_CACHE_DIR / f"markets_{exchange.id}{suffix}.json"
+
+def _read_markets_cache(path):
+    """Returns (age_in_seconds, cached_data) or (None, None) if there is no usable cache."""
+    try:
+        age = time.time() - path.stat().st_mtime
+        with open(path, 'rb') as f:
+            return age, orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None, None
+
+def _write_markets_cache(path, exchange):
+    """Writes the loaded markets of an exchange to the cache file atomically."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps({'markets': exchange.markets, 'currencies': exchange.currencies}))
+        os.replace(tmp_path, path)
+    except (OSError, TypeError) as e:
+        logging.warning(f"Could not write markets cache {path}: {e}")
+
+async def _refresh_markets_cache(exchange_class, default_type, path):
+    """Fetches fresh markets with a throwaway instance so the caller's instance is never blocked."""
+    exchange = exchange_class({'options': {'defaultType': default_type}} if default_type else {})
+    try:
+        await exchange.load_markets()
+        _write_markets_cache(path, exchange)
+    except ccxt.BaseError as e:
+        logging.warning(f"Background markets refresh for {exchange.id} failed: {e}")
+    finally:
+        await exchange.close()
+
+async def wait_for_markets_refresh():
+    """
+    Waits for the background markets refreshes still running. One-shot runs call this before
+    their event loop closes, which would otherwise cancel the refresh and keep the stale cache.
+    """
+    if _refresh_tasks:
+        await asyncio.gather(*_refresh_tasks, return_exceptions=True)
+
+async def load_markets_cached(exchange):
+    """
+    Loads the markets of an exchange from the disk cache instead of the exchange API.
+    Stale caches are still used and refreshed in the background, only a missing cache
+    blocks on load_markets.
+    """
+    path = markets_cache_path(exchange)
+    age, cached = _read_markets_cache(path)
+    if cached is not None:
+        exchange.set_markets(cached['markets'], cached.get('currencies'))
+        if age > MARKETS_CACHE_TTL:
+            task = asyncio.create_task(
+                _refresh_markets_cache(type(exchange), exchange.options.get('defaultType'), path)
+            )
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        return
+
+    try:
+        await exchange.load_markets()
+    except ccxt.BaseError as e:
+        # Leave it to the first API call to load the markets and report the error there
+        logging.warning(f"Could not load markets for {exchange.id}: {e}")
+        return
+    _write_markets_cache(path, exchange)
@@ -1,29 +1,42 @@
+from sqlalchemy import func, select
 from app.database.database import get_session
 from app.models.market_data import MarketData
 
+# Rows fetched from the database cursor and printed per DataFrame chunk
+VIEW_CHUNK_SIZE = 50_000
+
 def view_market_data():
     """Queries and displays the content of the market_data table."""
     print("Querying database for market data...")
+    # All data from the market_data table, ordered for readability
+    query = select(MarketData.__table__).order_by(MarketData.exchange, MarketData.symbol, MarketData.timestamp)
     with get_session() as session:
-        # Query all data from the market_data table, ordered for readability
-        data = session.query(MarketData).order_by(MarketData.exchange, MarketData.symbol, MarketData.timestamp).all()
-
-        if not data:
-            print("\n>>> The 'market_data' table is empty.")
-            return
-
         # For better readability, use pandas to display the data in a table
         try:
             import pandas as pd
-            df = pd.DataFrame([{
-                'id': d.id, 'exchange': d.exchange, 'symbol': d.symbol,
-                'timestamp': d.timestamp, 'open': d.open, 'high': d.high,
-                'low': d.low, 'close': d.close, 'volume': d.volume
-            } for d in data])
-            print(f"\nFound {len(df)} records in 'market_data' table:")
-            # Use to_string() to ensure all rows and columns are printed
-            print(df.to_string())
         except ImportError:
+            data = session.query(MarketData).order_by(MarketData.exchange, MarketData.symbol, MarketData.timestamp).all()
+            if not data:
+                print("\n>>> The 'market_data' table is empty.")
+                return
             print("\nPandas library not found. Printing raw data instead:")
             for row in data:
-                print(row)
\ No newline at end of file
+                print(row)
+            return
+
+        total = session.execute(select(func.count()).select_from(MarketData.__table__)).scalar()
+        if not total:
+            print("\n>>> The 'market_data' table is empty.")
+            return
+
+        print(f"\nFound {total} records in 'market_data' table:")
+        # Read the rows straight from the cursor into columns, without building ORM objects,
+        # and print them a chunk at a time so only one chunk is held in memory
+        printed = 0
+        with session.bind.connect() as conn:
+            for chunk in pd.read_sql(query, conn, parse_dates=['timestamp'], chunksize=VIEW_CHUNK_SIZE):
+                # Continue the row numbers of the previous chunk
+                chunk.index += printed
+                # Use to_string() to ensure all rows and columns are printed
+                print(chunk.to_string(header=printed == 0))
+                printed += len(chunk)
@@ -6,15 +6,24 @@ import asyncio
 # Add the app directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
-from app.feed.market_data_feed import fetch_market_data, setup_database
+# Load .env before the configuration modules read the environment
+from app.config_env import load_env_file
+load_env_file()
+
+# Use uvloop for every asyncio.run below when it is installed
+from app.utils.event_loop import install_event_loop_policy
+install_event_loop_policy()
+
+from app.feed.market_data_feed import fetch_market_data, stream_market_data, setup_database
 from app.scanners.arbitrage_scanner import scan_for_arbitrage, scan_continuously
-from app.simulators.backtrader_simulator import run_backtest
+from app.simulators.backtrader_simulator import run_backtest, run_backtests_all_pairs
 from app.utils.view_db import view_market_data
 
 def main():
     parser = argparse.ArgumentParser(description='Crypto Arbitrage Stack')
-    parser.add_argument('action', choices=['setup', 'feed', 'scan', 'scan-continuous', 'backtest', 'view'], help='Action to perform')
+    parser.add_argument('action', choices=['setup', 'feed', 'feed-stream', 'scan', 'scan-continuous', 'backtest', 'backtest-all', 'view'], help='Action to perform')
     parser.add_argument('--plot', action='store_true', help='Generate a plot for the backtest results (used with "backtest" action)')
+    parser.add_argument('--engine', choices=['vectorized', 'cerebro'], default='vectorized', help='Backtest engine (used with "backtest" action, default: vectorized; --plot uses cerebro)')
     parser.add_argument('--interval', type=int, default=15, help='Scan interval in seconds for continuous mode (default: 15)')
 
     args = parser.parse_args()
@@ -25,8 +34,14 @@ def main():
         print("Database setup completed successfully.")
     elif args.action == 'feed':
         print("Fetching market data...")
-        fetch_market_data()
+        asyncio.run(fetch_market_data())
         print("Market data fetched successfully.")
+    elif args.action == 'feed-stream':
+        print("Streaming market data (press Ctrl+C to stop)...")
+        try:
+            asyncio.run(stream_market_data())
+        except KeyboardInterrupt:
+            print("Market data stream stopped.")
     elif args.action == 'scan':
         print("Scanning for arbitrage opportunities...")
         asyncio.run(scan_for_arbitrage())
@@ -34,7 +49,9 @@ def main():
         print(f"Starting continuous arbitrage scanning (interval: {args.interval}s)...")
         asyncio.run(scan_continuously(scan_interval=args.interval))
     elif args.action == 'backtest':
-        run_backtest(plot=args.plot)
+        run_backtest(plot=args.plot, engine=args.engine)
+    elif args.action == 'backtest-all':
+        run_backtests_all_pairs()
     elif args.action == 'view':
         view_market_data()
 
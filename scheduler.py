@@ -1,5 +1,3 @@
-import schedule
-import time
 import logging
 import sys
 import os
@@ -8,41 +6,63 @@ import asyncio
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
+# Load .env before the configuration modules read the environment
+from app.config_env import load_env_file
+load_env_file()
+
+# Use uvloop for the scheduler's event loop when it is installed
+from app.utils.event_loop import install_event_loop_policy
+install_event_loop_policy()
+
 from app.feed.market_data_feed import fetch_market_data
-from app.scanners.arbitrage_scanner import scan_for_arbitrage
+from app.scanners.arbitrage_scanner import scan_for_arbitrage, close_all_exchanges
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def run_feed_job():
+# Seconds between the starts of two runs of each job
+FEED_INTERVAL = 60
+SCAN_INTERVAL = 15
+
+async def run_feed_job():
     """Wrapper function for the data feed job to add logging and error handling."""
     logging.info("--- SCHEDULER: Running data feed job ---")
     try:
-        fetch_market_data()
+        await fetch_market_data()
     except Exception as e:
         logging.error(f"An error occurred in the data feed job: {e}", exc_info=True)
     logging.info("--- SCHEDULER: Data feed job finished ---")
 
-def run_scan_job():
+async def run_scan_job():
     """Wrapper function for the arbitrage scan job to add logging and error handling."""
     logging.info("--- SCHEDULER: Running arbitrage scan job ---")
     try:
-        asyncio.run(scan_for_arbitrage())
+        # Keep the pooled exchange connections open for the next scan
+        await scan_for_arbitrage(close_exchanges=False)
     except Exception as e:
         logging.error(f"An error occurred in the arbitrage scan job: {e}", exc_info=True)
     logging.info("--- SCHEDULER: Arbitrage scan job finished ---")
 
+async def periodic(job, interval):
+    """Runs job every interval seconds, or right after the previous run if it took longer."""
+    while True:
+        await asyncio.gather(job(), asyncio.sleep(interval))
 
-if __name__ == "__main__":
-    logging.info("Starting scheduler...")
-
-    # Schedule the data feed to run every minute.
-    schedule.every(1).minutes.do(run_feed_job)
+async def main():
+    """Runs both jobs on one event loop, so connections and loaded markets are kept between scans."""
+    try:
+        await asyncio.gather(
+            periodic(run_feed_job, FEED_INTERVAL),
+            periodic(run_scan_job, SCAN_INTERVAL),
+        )
+    finally:
+        await close_all_exchanges()
 
-    # Schedule the arbitrage scanner to run more frequently (e.g., every 15 seconds).
-    schedule.every(15).seconds.do(run_scan_job)
 
+if __name__ == "__main__":
+    logging.info("Starting scheduler...")
     logging.info("Scheduler started. Press Ctrl+C to exit.")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.info("Scheduler stopped.")
@@ -0,0 +1,275 @@
+import asyncio
+import builtins
+import tempfile
+import unittest
+import ccxt.async_support as ccxt
+from decimal import Decimal
+from unittest.mock import patch, MagicMock, AsyncMock
+
+# It's good practice to add the app path for test discovery
+import sys
+import os
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.scanners import arbitrage_scanner
+from app.scanners.arbitrage_scanner import (
+    BASE_CURRENCIES, EXCHANGES, LATEST, PLAN, TICKER_FETCH_RETRIES, fetch_tickers_cached, fetch_tickers_for_exchange,
+    latest_prices, opportunity_writer, scan_prices, simulate_trade, ticker_feed, update_latest,
+)
+
+class TestTickerFeed(unittest.TestCase):
+
+    def setUp(self):
+        LATEST.clear()
+
+    def tearDown(self):
+        LATEST.clear()
+
+    def test_repeated_ticker_is_not_stamped_again(self):
+        """
+        Test that a ticker repeated unchanged from the websocket cache ages out of the scans.
+        """
+        ticker = {'bid': 100.0, 'ask': 100.1, 'timestamp': 1700000000000}
+
+        with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0):
+            update_latest('bybit', {'BTC/USDT:USDT': ticker})
+        with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1040.0):
+            # The stream stalled, the same cached ticker comes back
+            update_latest('bybit', {'BTC/USDT:USDT': dict(ticker)})
+            self.assertEqual(latest_prices(max_age=30), {'bybit': {}})
+            # A new update from the exchange makes it fresh again
+            update_latest('bybit', {'BTC/USDT:USDT': dict(ticker, timestamp=1700000040000)})
+            self.assertIn('BTC/USDT:USDT', latest_prices(max_age=30)['bybit'])
+
+    def test_feed_restarts_after_unexpected_error(self):
+        """
+        Test that an unexpected exception is logged and the feed keeps running.
+        """
+        exchange = MagicMock()
+        exchange.has = {'watchTickers': True}
+        exchange.watch_tickers = AsyncMock(side_effect=[
+            RuntimeError('boom'),
+            {'BTC/USDT:USDT': {'bid': 100.0, 'ask': 100.1, 'timestamp': 1}},
+            asyncio.CancelledError(),
+        ])
+
+        with patch.object(arbitrage_scanner, 'TICKER_RECONNECT_DELAY', 0), self.assertLogs(level='ERROR'):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(ticker_feed(exchange, 'bybit', ['BTC/USDT:USDT']))
+
+        self.assertEqual(exchange.watch_tickers.await_count, 3)
+        self.assertEqual(LATEST['bybit']['BTC/USDT:USDT']['bid'], 100.0)
+
+class TestScanPrices(unittest.TestCase):
+
+    def prices(self, quotes):
+        """Builds prices_by_exchange from {(base_currency, exchange_name): (bid, ask)}."""
+        prices_by_exchange = {}
+        for i, _, exchange_name, pair in PLAN:
+            quote = quotes.get((BASE_CURRENCIES[i], exchange_name))
+            if quote:
+                prices_by_exchange.setdefault(exchange_name, {})[pair] = {'bid': quote[0], 'ask': quote[1]}
+        return prices_by_exchange
+
+    def test_break_even_is_not_profitable(self):
+        """
+        Test that buying at 99.96 and selling at 100.04 with 0.04% fees on both sides is not profitable.
+        """
+        fees = {'bybit': Decimal('0.0004'), 'bitstamp': Decimal('0.0004')}
+        with patch.dict(arbitrage_scanner.DECIMAL_FEES, fees):
+            opportunity = simulate_trade('BTC', 'bybit', 100.04, 'bitstamp', 99.96, 10000)
+
+        self.assertEqual(opportunity.effective_sell_price, opportunity.effective_buy_price)
+        self.assertFalse(opportunity.profitable)
+
+    def test_tied_prices_pick_the_first_exchange(self):
+        """
+        Test that the first exchange is used for both legs when all exchanges quote the same prices.
+        """
+        if len(EXCHANGES) < 2:
+            self.skipTest('needs at least two exchanges')
+        opportunity = scan_prices(self.prices({('BTC', name): (100.0, 100.0) for name in EXCHANGES}))[0]
+
+        self.assertEqual(opportunity.best_bid_exchange, EXCHANGES[0])
+        self.assertEqual(opportunity.best_ask_exchange, EXCHANGES[0])
+        self.assertFalse(opportunity.profitable)
+
+    def test_rows_quoted_on_fewer_than_two_exchanges_are_skipped(self):
+        """
+        Test that base currencies with prices from fewer than two exchanges have no opportunity.
+        """
+        if len(EXCHANGES) < 2:
+            self.skipTest('needs at least two exchanges')
+        quotes = {('ETH', EXCHANGES[0]): (2000.0, 2000.5)}
+        quotes.update({('BTC', name): (100.0 + j, 100.5 + j) for j, name in enumerate(EXCHANGES)})
+        opportunities = scan_prices(self.prices(quotes))
+
+        self.assertEqual(len(opportunities), len(BASE_CURRENCIES))
+        self.assertIsNotNone(opportunities[BASE_CURRENCIES.index('BTC')])
+        self.assertIsNone(opportunities[BASE_CURRENCIES.index('ETH')])
+        self.assertIsNone(opportunities[BASE_CURRENCIES.index('SOL')])
+
+class TestFetchTickersCached(unittest.TestCase):
+
+    SYMBOLS = ['BTC/USDT:USDT']
+    PRICES = {'BTC/USDT:USDT': {'bid': 100.0, 'ask': 100.1}}
+
+    def setUp(self):
+        arbitrage_scanner._TICKER_CACHE.clear()
+
+    def tearDown(self):
+        arbitrage_scanner._TICKER_CACHE.clear()
+
+    def fetch(self):
+        return fetch_tickers_cached(MagicMock(), 'bybit', self.SYMBOLS)
+
+    def test_in_flight_request_is_shared(self):
+        """
+        Test that concurrent callers await the same request.
+        """
+        async def run():
+            release = asyncio.Event()
+
+            async def slow_fetch(exchange, exchange_name, symbols):
+                await release.wait()
+                return self.PRICES
+
+            with patch.object(arbitrage_scanner, 'fetch_tickers_for_exchange', side_effect=slow_fetch) as fetch:
+                first = asyncio.ensure_future(self.fetch())
+                second = asyncio.ensure_future(self.fetch())
+                await asyncio.sleep(0)
+                release.set()
+                results = await asyncio.gather(first, second)
+            return fetch, results
+
+        fetch, results = asyncio.run(run())
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(results, [self.PRICES, self.PRICES])
+
+    def test_result_expires_after_ttl(self):
+        """
+        Test that a result is reused within TICKER_CACHE_TTL and fetched again after it.
+        """
+        async def run():
+            with patch.object(arbitrage_scanner, 'fetch_tickers_for_exchange', AsyncMock(return_value=self.PRICES)) as fetch:
+                with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0):
+                    await self.fetch()
+                with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0 + arbitrage_scanner.TICKER_CACHE_TTL / 2):
+                    await self.fetch()
+                self.assertEqual(fetch.await_count, 1)
+                with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0 + arbitrage_scanner.TICKER_CACHE_TTL * 2):
+                    await self.fetch()
+                self.assertEqual(fetch.await_count, 2)
+
+        asyncio.run(run())
+
+    def test_other_event_loop_is_a_miss(self):
+        """
+        Test that a result cached on one event loop is not reused from another.
+        """
+        with patch.object(arbitrage_scanner, 'fetch_tickers_for_exchange', AsyncMock(return_value=self.PRICES)) as fetch:
+            with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0):
+                self.assertEqual(asyncio.run(self.fetch()), self.PRICES)
+                self.assertEqual(asyncio.run(self.fetch()), self.PRICES)
+
+        self.assertEqual(fetch.await_count, 2)
+
+    def test_failed_fetch_is_not_cached(self):
+        """
+        Test that a request that raised or returned no prices is not reused.
+        """
+        async def run():
+            side_effect = [RuntimeError('boom'), {}, self.PRICES]
+            with patch.object(arbitrage_scanner, 'fetch_tickers_for_exchange', AsyncMock(side_effect=side_effect)) as fetch:
+                with patch.object(arbitrage_scanner.time, 'monotonic', return_value=1000.0):
+                    with self.assertRaises(RuntimeError):
+                        await self.fetch()
+                    self.assertEqual(await self.fetch(), {})
+                    self.assertEqual(await self.fetch(), self.PRICES)
+                    self.assertEqual(await self.fetch(), self.PRICES)
+            return fetch
+
+        fetch = asyncio.run(run())
+        self.assertEqual(fetch.await_count, 3)
+
+@patch.object(arbitrage_scanner, 'TICKER_RETRY_BASE_DELAY', 0)
+class TestFetchRetries(unittest.TestCase):
+
+    SYMBOLS = ['BTC/USDT:USDT']
+
+    def fetch(self, side_effect):
+        exchange = MagicMock()
+        exchange.has = {'fetchTickers': True}
+        exchange.fetch_tickers = AsyncMock(side_effect=side_effect)
+        with patch.object(arbitrage_scanner.random, 'random', return_value=0.0), self.assertLogs(level='WARNING'):
+            prices = asyncio.run(fetch_tickers_for_exchange(exchange, 'bybit', self.SYMBOLS))
+        return exchange.fetch_tickers, prices
+
+    def test_network_errors_are_retried_up_to_the_limit(self):
+        """
+        Test that NetworkError and RequestTimeout are retried TICKER_FETCH_RETRIES times, then given up on.
+        """
+        for error in (ccxt.NetworkError, ccxt.RequestTimeout):
+            with self.subTest(error=error.__name__):
+                fetch, prices = self.fetch(error('down'))
+                self.assertEqual(fetch.await_count, TICKER_FETCH_RETRIES + 1)
+                self.assertEqual(prices, {})
+
+    def test_retry_succeeds_after_transient_error(self):
+        """
+        Test that a request succeeding on a retry returns its prices.
+        """
+        fetch, prices = self.fetch([ccxt.RequestTimeout('slow'), {'BTC/USDT:USDT': {'bid': 100.0, 'ask': 100.1}}])
+        self.assertEqual(fetch.await_count, 2)
+        self.assertEqual(prices, {'BTC/USDT:USDT': {'bid': 100.0, 'ask': 100.1}})
+
+    def test_other_errors_are_not_retried(self):
+        """
+        Test that BadSymbol and ExchangeError fail on the first attempt.
+        """
+        for error in (ccxt.BadSymbol, ccxt.ExchangeError):
+            with self.subTest(error=error.__name__):
+                fetch, prices = self.fetch(error('rejected'))
+                self.assertEqual(fetch.await_count, 1)
+                self.assertEqual(prices, {})
+
+class TestOpportunityWriter(unittest.TestCase):
+
+    def tearDown(self):
+        arbitrage_scanner._opportunity_queue = None
+
+    def test_write_error_falls_back_to_direct_writes(self):
+        """
+        Test that after a failed write the queued opportunities are written directly, not to the failed handle.
+        """
+        broken = MagicMock()
+        broken.__enter__.return_value = broken
+        broken.write.side_effect = OSError('disk full')
+        opens = [broken]
+        real_open = builtins.open
+
+        def fake_open(*args, **kwargs):
+            return opens.pop() if opens else real_open(*args, **kwargs)
+
+        async def run():
+            queue = arbitrage_scanner._opportunity_queue = asyncio.Queue()
+            for n in range(3):
+                queue.put_nowait({'n': n})
+            await opportunity_writer(queue)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'opportunities.jsonl')
+            with patch.object(arbitrage_scanner, 'OPPORTUNITIES_FILE', path), \
+                    patch('builtins.open', side_effect=fake_open), self.assertLogs(level='ERROR'):
+                asyncio.run(run())
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(broken.write.call_count, 1)
+        self.assertIsNone(arbitrage_scanner._opportunity_queue)
+        self.assertEqual(lines, ['{"n":1}', '{"n":2}'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import unittest
+import io
+import contextlib
+from unittest.mock import patch
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+# It's good practice to add the app path for test discovery
+import sys
+import os
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.simulators import _arb_kernel, backtrader_simulator
+from app.simulators.backtrader_simulator import (
+    INITIAL_CASH, COMMISSION, ArbitrageStrategy, load_feeds, make_feeds, run_backtest_vectorized, run_backtests_all_pairs,
+    run_parameter_sweep, run_with, scan_trades,
+)
+
+class TestArbitrageKernel(unittest.TestCase):
+
+    def test_scan_entries_and_exits(self):
+        """
+        Test the kernel's entry, convergence exit and time-based exit bars.
+        """
+        prices = np.array([
+            [100.0, 100.1],  # 0: spread below the profit target
+            [100.0, 101.0],  # 1: enter, buy on 0 and sell on 1
+            [100.5, 100.8],  # 2: still apart
+            [100.9, 100.8],  # 3: converged, exit
+            [101.0, 100.0],  # 4: enter, buy on 1 and sell on 0
+            [101.0, 100.0],  # 5: still apart
+            [101.0, 100.0],  # 6: exit_after_bars reached
+        ])
+
+        entries, exits = _arb_kernel.make_scan(2)(prices, 0.002, 2)
+
+        self.assertEqual(entries.tolist(), [[1, 0, 1], [4, 1, 0]])
+        self.assertEqual(exits.tolist(), [3, 6])
+
+    def run_per_bar(self, combined_df, **strategy_params):
+        """Runs the strategy without kernel trades, deciding on every bar in float64."""
+        cerebro = bt.Cerebro()
+        cerebro.broker.setcash(INITIAL_CASH)
+        cerebro.broker.setcommission(commission=COMMISSION)
+        for data_feed in make_feeds(combined_df):
+            cerebro.adddata(data_feed)
+        cerebro.addstrategy(ArbitrageStrategy, **strategy_params)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            cerebro.run()
+        return cerebro.broker.getvalue(), output.getvalue()
+
+    def test_kernel_trades_match_strategy(self):
+        """
+        Test that run_with on the float32 kernel trades gives the same backtest as letting the strategy decide.
+        """
+        rng = np.random.default_rng(0)
+        prices = 30000 + np.cumsum(rng.normal(0, 30, 300))[:, None] + rng.normal(0, 60, (300, 3))
+        combined_df = pd.DataFrame(
+            prices, index=pd.date_range('2024-01-01', periods=len(prices), freq='min'), columns=['bybit', 'bitstamp', 'binance'],
+        )
+
+        self.assertGreater(len(scan_trades(combined_df, 0.002, 10)[0]), 0)
+        # No warning means the kernel trades were used
+        with self.assertNoLogs(level='WARNING'), contextlib.redirect_stdout(io.StringIO()) as output:
+            cerebro = run_with(make_feeds(combined_df), profit_target=0.002, exit_after_bars=10)
+        self.assertEqual((cerebro.broker.getvalue(), output.getvalue()), self.run_per_bar(combined_df))
+        # The vectorized engine books the same fills and commissions as the broker
+        trade_pnl = run_backtest_vectorized(combined_df, 0.002, COMMISSION, 10)
+        self.assertAlmostEqual(INITIAL_CASH + trade_pnl.sum(), cerebro.broker.getvalue(), places=6)
+
+    def test_unfunded_trades_are_decided_per_bar(self):
+        """
+        Test that run_with leaves the strategy to decide on every bar when the broker would reject orders.
+        """
+        rng = np.random.default_rng(0)
+        prices = 30000 + np.cumsum(rng.normal(0, 30, 300))[:, None] + rng.normal(0, 60, (300, 2))
+        combined_df = pd.DataFrame(
+            prices, index=pd.date_range('2024-01-01', periods=len(prices), freq='min'), columns=['bybit', 'bitstamp'],
+        )
+
+        with self.assertLogs(level='WARNING'), contextlib.redirect_stdout(io.StringIO()) as output:
+            cerebro = run_with(make_feeds(combined_df), trade_amount=2 * INITIAL_CASH)
+
+        self.assertIn('Margin', output.getvalue())
+        self.assertEqual(
+            (cerebro.broker.getvalue(), output.getvalue()),
+            self.run_per_bar(combined_df, trade_amount=2 * INITIAL_CASH),
+        )
+
+    def test_float32_convergence_closes_cerebro_position(self):
+        """
+        Test that Cerebro closes the legs on a kernel exit when prices only converge in float32.
+        """
+        prices = np.array([
+            [20000.0, 20000.0],
+            [20000.0, 20100.0],      # 1: enter
+            [20000.0, 20080.0],
+            [20000.0001, 20000.0009],  # 3: equal in float32, the kernel exits
+            [20000.0, 20000.0],
+            [20000.0, 20000.0],
+            [20000.0, 20100.0],      # 6: enter again
+            [20000.0, 20050.0],
+            [20000.0, 20050.0],
+        ])
+        combined_df = pd.DataFrame(
+            prices, index=pd.date_range('2024-01-01', periods=len(prices), freq='min'), columns=['bybit', 'bitstamp'],
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            cerebro = run_with(make_feeds(combined_df), profit_target=0.002, exit_after_bars=10)
+
+        trade_pnl = run_backtest_vectorized(combined_df, 0.002, COMMISSION, 10)
+        self.assertEqual(len(trade_pnl), 2)
+        self.assertAlmostEqual(cerebro.broker.getvalue() - INITIAL_CASH, trade_pnl.sum(), places=6)
+
+    def test_legs_are_funded_at_btc_prices(self):
+        """
+        Test that at prices above the initial cash no order is rejected and both engines agree.
+        """
+        rng = np.random.default_rng(1)
+        prices = 100000 + np.cumsum(rng.normal(0, 100, 300))[:, None] + rng.normal(0, 200, (300, 2))
+        combined_df = pd.DataFrame(
+            prices, index=pd.date_range('2024-01-01', periods=len(prices), freq='min'), columns=['bybit', 'bitstamp'],
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            cerebro = run_with(make_feeds(combined_df))
+
+        self.assertNotIn('Margin', output.getvalue())
+        trade_pnl = run_backtest_vectorized(combined_df, 0.002, COMMISSION, 10)
+        self.assertGreater(len(trade_pnl), 0)
+        self.assertAlmostEqual(cerebro.broker.getvalue() - INITIAL_CASH, trade_pnl.sum(), places=6)
+
+class TestParameterSweep(unittest.TestCase):
+
+    def setUp(self):
+        backtrader_simulator._feeds_by_symbol.clear()
+
+    def tearDown(self):
+        backtrader_simulator._feeds_by_symbol.clear()
+
+    def price_matrix(self, seed):
+        rng = np.random.default_rng(seed)
+        prices = 30000 + np.cumsum(rng.normal(0, 30, 300))[:, None] + rng.normal(0, 60, (300, 2))
+        return pd.DataFrame(
+            prices, index=pd.date_range('2024-01-01', periods=len(prices), freq='min'), columns=['bybit', 'bitstamp'],
+        )
+
+    def test_sweep_on_shared_feeds_matches_fresh_runs(self):
+        """
+        Test that a sweep reusing one set of feeds gives the same results as a fresh run per parameter set.
+        """
+        combined_df = self.price_matrix(0)
+        params = [(0.001, 5), (0.002, 10), (0.001, 10)]
+
+        with patch.object(backtrader_simulator, 'price_history_stamp', return_value=b'1|300'), \
+                patch.object(backtrader_simulator, 'load_price_matrix', return_value=combined_df), \
+                contextlib.redirect_stdout(io.StringIO()):
+            results = run_parameter_sweep('BTC/USD', (0.001, 0.002), (5, 10))
+            for profit_target, exit_after_bars in params:
+                cerebro = run_with(make_feeds(combined_df), profit_target=profit_target, exit_after_bars=exit_after_bars)
+                self.assertEqual(results[(profit_target, exit_after_bars)], cerebro.broker.getvalue() - INITIAL_CASH)
+        self.assertEqual(len(set(results.values())), len(results))
+
+    def test_feeds_are_rebuilt_when_history_changes(self):
+        """
+        Test that load_feeds reuses the feeds while the history stamp is unchanged and reloads them after.
+        """
+        matrices = [self.price_matrix(0), self.price_matrix(1)]
+        with patch.object(backtrader_simulator, 'price_history_stamp', side_effect=[b'1|300', b'1|300', b'2|301']), \
+                patch.object(backtrader_simulator, 'load_price_matrix', side_effect=matrices) as load_price_matrix:
+            first = load_feeds('BTC/USD')
+            self.assertIs(load_feeds('BTC/USD'), first)
+            self.assertIsNot(load_feeds('BTC/USD'), first)
+        self.assertEqual(load_price_matrix.call_count, 2)
+
+class TestRunBacktestsAllPairs(unittest.TestCase):
+
+    def test_no_pairs(self):
+        """
+        Test that an empty pair list returns no results instead of failing to start the process pool.
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(run_backtests_all_pairs(()), {})
+
+if __name__ == '__main__':
+    unittest.main()
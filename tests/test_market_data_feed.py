@@ -1,96 +1,178 @@
+import asyncio
 import unittest
 import datetime
-from unittest.mock import patch, MagicMock, ANY
+from unittest.mock import patch, MagicMock, AsyncMock, DEFAULT, ANY
 
 # It's good practice to add the app path for test discovery
 import sys
 import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
-from app.feed.market_data_feed import fetch_market_data
-from app.models.market_data import MarketData
+from app.feed.market_data_feed import ccxtpro, create_exchange, fetch_market_data, stream_symbol_ohlcv
 
+# Patch the dependencies of every test in one go: the database session and engine,
+# the ccxt library and the markets disk cache. The DEFAULT mocks are passed as keyword arguments.
+@patch.multiple(
+    'app.feed.market_data_feed',
+    load_markets_cached=AsyncMock(),
+    engine=DEFAULT,
+    get_session=DEFAULT,
+    ccxt=DEFAULT,
+    EXCHANGE_PAIRS=(('test_exchange', 'BTC/USD'),),
+)
 class TestMarketDataFeed(unittest.TestCase):
 
-    # Patch the dependencies: the database session and the ccxt library
-    @patch('app.feed.market_data_feed.get_session')
-    @patch('app.feed.market_data_feed.ccxt')
-    @patch('app.feed.market_data_feed.EXCHANGES', ['test_exchange'])
-    @patch('app.feed.market_data_feed.TRADING_PAIRS', ['BTC/USD'])
-    def test_fetch_market_data_initial_run(self, mock_ccxt, mock_get_session):
+    def test_fetch_market_data_initial_run(self, ccxt, get_session, engine):
         """
         Test fetching data when the database is empty.
         """
         # --- Arrange ---
         # Mock the database session
         mock_session = MagicMock()
-        mock_session.query.return_value.filter_by.return_value.order_by.return_value.first.return_value = None
-        mock_get_session.return_value.__enter__.return_value = mock_session
+        mock_session.query.return_value.group_by.return_value.all.return_value = []
+        get_session.return_value.__enter__.return_value = mock_session
+        mock_conn = engine.begin.return_value.__enter__.return_value
 
         # Mock the ccxt exchange
         mock_exchange_instance = MagicMock()
         mock_exchange_instance.has = {'fetchOHLCV': True}
         # Simulate the API returning two candles
-        mock_exchange_instance.fetch_ohlcv.return_value = [
+        mock_exchange_instance.fetch_ohlcv = AsyncMock(return_value=[
             [1672531200000, 60000, 60100, 59900, 60050, 100], # 2023-01-01 00:00:00
             [1672531260000, 60050, 60150, 59950, 60100, 110], # 2023-01-01 00:01:00
-        ]
-        mock_ccxt.test_exchange.return_value = mock_exchange_instance
+        ])
+        mock_exchange_instance.load_markets = AsyncMock()
+        mock_exchange_instance.close = AsyncMock()
+        ccxt.test_exchange.return_value = mock_exchange_instance
 
         # --- Act ---
-        fetch_market_data()
+        asyncio.run(fetch_market_data())
 
         # --- Assert ---
-        # Verify we tried to connect to the exchange
-        mock_ccxt.test_exchange.assert_called_once()
+        # Verify we tried to connect to the exchange and released the connection afterwards
+        ccxt.test_exchange.assert_called_once()
+        mock_exchange_instance.close.assert_awaited_once()
         # Verify we asked for data since the beginning of time (since=None)
-        mock_exchange_instance.fetch_ohlcv.assert_called_once_with('BTC/USD', '1m', since=None)
-        # Verify that we added 2 new data points to the session
-        self.assertEqual(mock_session.add_all.call_count, 1)
-        added_data = mock_session.add_all.call_args[0][0]
+        mock_exchange_instance.fetch_ohlcv.assert_called_once_with('BTC/USD', '1m', since=None, limit=None)
+        # Verify that we inserted 2 new data points in a single executemany call
+        self.assertEqual(mock_conn.exec_driver_sql.call_count, 1)
+        added_data = mock_conn.exec_driver_sql.call_args[0][1]
         self.assertEqual(len(added_data), 2)
-        self.assertIsInstance(added_data[0], MarketData)
-        self.assertEqual(added_data[0].close, 60050)
-        # Verify the transaction was committed
-        mock_session.commit.assert_called_once()
-
-    @patch('app.feed.market_data_feed.get_session')
-    @patch('app.feed.market_data_feed.ccxt')
-    @patch('app.feed.market_data_feed.EXCHANGES', ['test_exchange'])
-    @patch('app.feed.market_data_feed.TRADING_PAIRS', ['BTC/USD'])
-    def test_fetch_market_data_incremental_update(self, mock_ccxt, mock_get_session):
+        # Timestamps are stored as naive local time, like datetime.fromtimestamp
+        expected_timestamp = datetime.datetime.fromtimestamp(1672531200).isoformat(sep=' ', timespec='microseconds')
+        self.assertEqual(added_data[0], ('test_exchange', 'BTC/USD', expected_timestamp, 60000, 60100, 59900, 60050, 100))
+        # Verify the insert ran inside a transaction
+        engine.begin.assert_called_once()
+
+    def test_fetch_market_data_incremental_update(self, ccxt, get_session, engine):
         """
         Test fetching data incrementally when the database already has some records.
         """
         # --- Arrange ---
-        # Mock the database session to return a "latest" record
+        # Mock the database session to return a "latest" timestamp for the series
         mock_session = MagicMock()
         latest_timestamp = datetime.datetime(2023, 1, 1, 0, 1, 0)
-        latest_record = MagicMock()
-        latest_record.timestamp = latest_timestamp
-        mock_session.query.return_value.filter_by.return_value.order_by.return_value.first.return_value = latest_record
-        mock_get_session.return_value.__enter__.return_value = mock_session
+        mock_session.query.return_value.group_by.return_value.all.return_value = [
+            ('test_exchange', 'BTC/USD', latest_timestamp),
+        ]
+        get_session.return_value.__enter__.return_value = mock_session
+        mock_conn = engine.begin.return_value.__enter__.return_value
 
         # Mock the ccxt exchange
         mock_exchange_instance = MagicMock()
         mock_exchange_instance.has = {'fetchOHLCV': True}
         # Simulate the API returning only one *new* candle
-        mock_exchange_instance.fetch_ohlcv.return_value = [
+        mock_exchange_instance.fetch_ohlcv = AsyncMock(return_value=[
             [1672531320000, 60100, 60200, 60000, 60150, 120], # 2023-01-01 00:02:00
-        ]
-        mock_ccxt.test_exchange.return_value = mock_exchange_instance
+        ])
+        mock_exchange_instance.load_markets = AsyncMock()
+        mock_exchange_instance.close = AsyncMock()
+        ccxt.test_exchange.return_value = mock_exchange_instance
 
         # --- Act ---
-        fetch_market_data()
+        asyncio.run(fetch_market_data())
 
         # --- Assert ---
         # Verify we asked for data since the last record's timestamp
         expected_since_timestamp = int(latest_timestamp.timestamp() * 1000) + 1
-        mock_exchange_instance.fetch_ohlcv.assert_called_once_with('BTC/USD', '1m', since=expected_since_timestamp)
-        # Verify that we only added the 1 new data point
-        self.assertEqual(mock_session.add_all.call_count, 1)
-        self.assertEqual(len(mock_session.add_all.call_args[0][0]), 1)
-        mock_session.commit.assert_called_once()
+        # The last record is years old, so the request is capped at the maximum page size
+        mock_exchange_instance.fetch_ohlcv.assert_called_once_with('BTC/USD', '1m', since=expected_since_timestamp, limit=1000)
+        # Verify that we only inserted the 1 new data point
+        self.assertEqual(mock_conn.exec_driver_sql.call_count, 1)
+        self.assertEqual(len(mock_conn.exec_driver_sql.call_args[0][1]), 1)
+        engine.begin.assert_called_once()
+
+    def test_fetch_market_data_limits_recent_update(self, ccxt, get_session, engine):
+        """
+        Test that a recently updated series only requests the candles that can be missing.
+        """
+        # --- Arrange ---
+        mock_session = MagicMock()
+        now = datetime.datetime.now()
+        latest_timestamp = now - datetime.timedelta(minutes=3)
+        mock_session.query.return_value.group_by.return_value.all.return_value = [
+            ('test_exchange', 'BTC/USD', latest_timestamp),
+        ]
+        get_session.return_value.__enter__.return_value = mock_session
+
+        mock_exchange_instance = MagicMock()
+        mock_exchange_instance.has = {'fetchOHLCV': True}
+        mock_exchange_instance.fetch_ohlcv = AsyncMock(return_value=[])
+        mock_exchange_instance.load_markets = AsyncMock()
+        mock_exchange_instance.close = AsyncMock()
+        ccxt.test_exchange.return_value = mock_exchange_instance
+
+        # --- Act ---
+        asyncio.run(fetch_market_data())
+
+        # --- Assert ---
+        # 3 elapsed minutes plus the safety margin of 5 candles
+        self.assertEqual(mock_exchange_instance.fetch_ohlcv.call_args.kwargs['limit'], 8)
+        # Nothing was returned, so nothing is written
+        engine.begin.assert_not_called()
+
+class TestStreamSymbolOhlcv(unittest.TestCase):
+
+    def test_streaming_exchanges_return_every_cached_candle(self):
+        """
+        Test that websocket instances are created with newUpdates disabled.
+        """
+        with patch.object(ccxtpro, 'bybit') as exchange_class:
+            create_exchange('bybit', 'swap', module=ccxtpro)
+
+        config = exchange_class.call_args[0][0]
+        self.assertIs(config['newUpdates'], False)
+        self.assertEqual(config['options'], {'defaultType': 'swap'})
+
+    def test_candle_finished_before_cutoff_is_queued(self):
+        """
+        Test that a candle whose final update arrived before the clock passed its close
+        is still queued, once the next candle shows up in the cached candles.
+        """
+        first = [1672531200000, 60000, 60100, 59900, 60050, 100]
+        second = [1672531260000, 60050, 60150, 59950, 60100, 110]
+        exchange = MagicMock()
+        exchange.has = {'watchOHLCV': True}
+        # The local clock lags: it never gets a full minute past the first candle's open
+        exchange.milliseconds.return_value = first[0] + 50 * 1000
+        exchange.watch_ohlcv = AsyncMock(side_effect=[
+            [first],          # final update of the first candle, not closed yet by the clock
+            [first, second],  # the whole cache, the first candle is closed by the newer one
+            [first, second],  # nothing new
+            asyncio.CancelledError(),
+        ])
+        queue = asyncio.Queue()
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(stream_symbol_ohlcv(exchange, 'test_exchange', 'BTC/USD', queue))
+
+        self.assertEqual(queue.qsize(), 1)
+        rows = queue.get_nowait()
+        # Only the first candle, the second one is still forming
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][3:], (60000, 60100, 59900, 60050, 100))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file